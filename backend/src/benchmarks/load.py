@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from ml.reporting import summarize, write_results
+
+MESSAGES = {
+    "hi": ["नमस्ते", "मुझे मदद चाहिए", "आज मौसम कैसा है? मुझे बाहर जाना है।"],
+    "te": ["నమస్కారం", "నాకు సహాయం కావాలి", "ఈరోజు వాతావరణం ఎలా ఉంది?"],
+    "en": ["hello", "thank you", "what is the weather like today?"],
+}
+
+class _Connection:
+    """Minimal keep-alive HTTP/1.1 client, so the load generator needs no extra packages."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def post_json(self, path: str, payload: Dict) -> Tuple[int, bytes]:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("ascii") + body
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(request)
+                await self.writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed an idle keep-alive connection; reconnect once
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+async def run_load(
+    url: str = "http://localhost:8000/chat",
+    concurrency: int = 8,
+    num_requests: int = 200,
+    duration: Optional[float] = None,
+    languages: Sequence[str] = ("hi", "te"),
+    warmup: int = 10,
+    extra_payload: Optional[Dict] = None,
+    unique: bool = False
+) -> Dict:
+    """Send chat requests from ``concurrency`` workers and report latency.
+
+    Stops after ``num_requests`` requests, or after ``duration`` seconds if
+    given. Messages cycle through ``MESSAGES`` for each language; with
+    ``unique`` a timestamp is appended so the response cache is bypassed.
+    """
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/"
+    payloads = itertools.cycle([
+        {"message": message, "language": language, **(extra_payload or {})}
+        for language in languages
+        for message in MESSAGES.get(language, MESSAGES["en"])
+    ])
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+
+    async def phase(limit: int, deadline: Optional[float], workers: int, record: bool) -> int:
+        """Run ``workers`` clients until ``limit`` requests or ``deadline``."""
+        sent = 0
+
+        def next_payload() -> Optional[Dict]:
+            nonlocal sent
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return None
+            elif sent >= limit:
+                return None
+            sent += 1
+            payload = next(payloads)
+            if unique:
+                payload = dict(payload, message=f"{payload['message']} {time.perf_counter_ns()}")
+            return payload
+
+        async def worker():
+            connection = _Connection(host, port)
+            try:
+                while True:
+                    payload = next_payload()
+                    if payload is None:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        status, _ = await connection.post_json(path, payload)
+                    except Exception as e:
+                        if record:
+                            errors[type(e).__name__] += 1
+                        await connection.close()
+                        continue
+                    if record:
+                        statuses[status] += 1
+                        if status == 200:
+                            latencies[payload["language"]].append(time.perf_counter() - start)
+            finally:
+                await connection.close()
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return sent
+
+    # Warm up connections and the server before measuring
+    if warmup:
+        await phase(warmup, None, min(concurrency, warmup), record=False)
+
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+    sent = await phase(num_requests, deadline, concurrency, record=True)
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": sent,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(all_latencies) / elapsed if elapsed else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "errors": dict(errors),
+        "latency_ms": summarize(all_latencies),
+        "languages": {language: summarize(values) for language, values in latencies.items()},
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running /chat endpoint.")
+    parser.add_argument("--url", default="http://localhost:8000/chat")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead")
+    parser.add_argument("--languages", nargs="+", default=["hi", "te"])
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--unique", action="store_true",
+                        help="Make every message unique to bypass the response cache")
+    parser.add_argument("--payload", type=json.loads, default=None,
+                        help='Extra JSON fields for every request, e.g. \'{"quality": "fast"}\'')
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    write_results("load", asyncio.run(run_load(
+        args.url,
+        concurrency=args.concurrency,
+        num_requests=args.requests,
+        duration=args.duration,
+        languages=args.languages,
+        warmup=args.warmup,
+        extra_payload=args.payload,
+        unique=args.unique
+    )), args.output)
@@ -0,0 +1,84 @@
+import argparse
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks.stub_model import build_stub_model
+from ml.reporting import summarize, write_results
+
+PROMPTS = {
+    "hi": ["नमस्ते, कैसे हो आप?", "मुझे मदद चाहिए", "आज मौसम कैसा है? मुझे बाहर जाना है।"],
+    "te": ["నమస్కారం, ఎలా ఉన్నారు?", "నాకు సహాయం కావాలి", "ఈరోజు వాతావరణం ఎలా ఉంది?"],
+}
+
+def run_model_benchmark(
+    model_path: Optional[str] = None,
+    iterations: int = 5,
+    beam_sizes: Sequence[int] = (1, 5),
+    max_length: int = 100,
+    precision: str = "fp32",
+    num_threads: Optional[int] = None
+) -> Dict:
+    """Time ``generate_response`` per language and beam size.
+
+    Without ``model_path`` a tiny random stub model is built in a temporary
+    directory so the benchmark runs offline.
+    """
+    from ml.inference import MultilingualChatbot
+
+    with tempfile.TemporaryDirectory() as stub_dir:
+        stub = model_path is None
+        if stub:
+            model_path = build_stub_model(stub_dir)
+        chatbot = MultilingualChatbot(
+            model_path,
+            device="cpu",
+            precision=precision,
+            num_threads=num_threads
+        )
+
+        results = {"model_path": "stub" if stub else model_path, "languages": {}}
+        for language in chatbot.get_supported_languages():
+            prompts = PROMPTS.get(language, PROMPTS["hi"])
+            by_beam = {}
+            for num_beams in beam_sizes:
+                # Warm up once so one-off allocations are not timed
+                chatbot.generate_response(prompts[0], language, max_length=max_length, num_beams=num_beams)
+                latencies: List[float] = []
+                tokens = 0
+                for _ in range(iterations):
+                    for prompt in prompts:
+                        start = time.perf_counter()
+                        response = chatbot.generate_response(
+                            prompt, language, max_length=max_length, num_beams=num_beams
+                        )
+                        latencies.append(time.perf_counter() - start)
+                        tokens += len(chatbot.tokenizer(response, add_special_tokens=False)["input_ids"])
+                by_beam[f"beams_{num_beams}"] = {
+                    "latency_ms": summarize(latencies),
+                    "output_tokens_per_second": tokens / sum(latencies),
+                }
+            results["languages"][language] = by_beam
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark MultilingualChatbot.generate_response (tiny stub model by default)."
+    )
+    parser.add_argument("--model-path", default=None, help="Real model to benchmark instead of the stub")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--beams", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    write_results("model", run_model_benchmark(
+        args.model_path,
+        iterations=args.iterations,
+        beam_sizes=args.beams,
+        max_length=args.max_length,
+        precision=args.precision,
+        num_threads=args.threads
+    ), args.output)
@@ -0,0 +1,70 @@
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+from ml.reporting import summarize, write_results
+from rules.responses import ResponsePacks
+
+RULE_SERVER = os.path.join(os.path.dirname(__file__), "..", "..", "main.py")
+
+PACKS = ResponsePacks()
+
+def load_get_response() -> Callable[[str, str], str]:
+    """Import ``get_response`` from the rule-based server in backend/main.py."""
+    path = os.path.abspath(RULE_SERVER)
+    # backend/main.py imports the rules as ``src.rules``
+    if os.path.dirname(path) not in sys.path:
+        sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location("rule_server", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.get_response
+
+def benchmark_messages(language: str) -> List[str]:
+    """Return a mix of rule hits and misses for ``language``."""
+    pack = PACKS.pack(language)
+    triggers = list(pack.data.get("responses", {}))
+    triggers += [phrases[0] for phrases in pack.triggers.values() if phrases]
+    filler = "please tell me something about the weather today " * 4
+    return (
+        triggers
+        + [trigger.upper() for trigger in triggers]
+        + [f"{filler}{trigger}" for trigger in triggers]
+        + [pack.data["default"], filler, ""]
+    )
+
+def run_rules_benchmark(iterations: int = 2000, get_response=None) -> Dict:
+    """Time ``get_response`` per call for every response pack language."""
+    get_response = get_response or load_get_response()
+    results = {}
+    for language in PACKS.languages():
+        messages = benchmark_messages(language)
+        for message in messages:
+            get_response(message, language)
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for message in messages:
+                call_start = time.perf_counter()
+                get_response(message, language)
+                latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+
+        results[language] = {
+            "messages": len(messages),
+            "calls_per_second": len(latencies) / elapsed,
+            "latency_us": summarize(latencies, scale=1e6),
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark the rule-based get_response.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    write_results("rules", run_rules_benchmark(args.iterations), args.output)
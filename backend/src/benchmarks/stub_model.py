@@ -0,0 +1,79 @@
+import os
+from typing import Iterable, Optional
+
+import sentencepiece as spm
+import torch
+from transformers import (
+    MBart50Tokenizer,
+    MBart50TokenizerFast,
+    MBartConfig,
+    MBartForConditionalGeneration
+)
+
+from rules.responses import ResponsePacks
+
+def _corpus() -> Iterable[str]:
+    """Texts in every response pack, used to train the stub tokenizer."""
+    def texts(value):
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                yield key
+                yield from texts(item)
+        elif isinstance(value, list):
+            for item in value:
+                yield from texts(item)
+    packs = ResponsePacks()
+    for language in packs.languages():
+        yield from texts(packs.pack(language).data)
+
+def build_stub_model(
+    output_dir: str,
+    d_model: int = 64,
+    num_layers: int = 2,
+    num_heads: int = 4,
+    ffn_dim: int = 256,
+    vocab_size: int = 1000,
+    seed: int = 0,
+    texts: Optional[Iterable[str]] = None
+) -> str:
+    """Save a tiny randomly initialized mBART-50 model and tokenizer.
+
+    The sentencepiece vocabulary is trained on ``texts`` (the response
+    packs by default), so nothing is downloaded. The result loads with
+    ``MultilingualChatbot(model_path=output_dir)``. Replies are random, but
+    the code path and tensor shapes match the real model.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    spm_prefix = os.path.join(output_dir, "sentencepiece.bpe")
+    spm.SentencePieceTrainer.train(
+        sentence_iterator=iter(list(texts or _corpus())),
+        model_prefix=spm_prefix,
+        vocab_size=vocab_size,
+        hard_vocab_limit=False,
+        character_coverage=1.0,
+        minloglevel=2
+    )
+    MBart50Tokenizer(vocab_file=f"{spm_prefix}.model").save_pretrained(output_dir)
+    tokenizer = MBart50TokenizerFast.from_pretrained(output_dir)
+
+    torch.manual_seed(seed)
+    config = MBartConfig(
+        vocab_size=len(tokenizer),
+        d_model=d_model,
+        encoder_layers=num_layers,
+        decoder_layers=num_layers,
+        encoder_attention_heads=num_heads,
+        decoder_attention_heads=num_heads,
+        encoder_ffn_dim=ffn_dim,
+        decoder_ffn_dim=ffn_dim,
+        max_position_embeddings=1024,
+        pad_token_id=tokenizer.pad_token_id,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        decoder_start_token_id=tokenizer.eos_token_id
+    )
+    MBartForConditionalGeneration(config).save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    return output_dir
@@ -1,8 +1,36 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-from ml.inference import MultilingualChatbot
+from typing import Literal, Optional
+from ml.inference import ModelNotReadyError, MultilingualChatbot
+from ml.onnx_inference import OnnxChatbot
+from ml.batch_inference import BatchRunner, parse_jsonl
+from ml.loading import BackgroundLoader, checkpoint_hash
+from ml.workers import WorkerPool
+from ml.optimization import VALIDATION_PROMPTS
+from ml.batching import BatchingEngine, DeadlineExceededError, OverloadedError, QueueFullError
+from ml.cache import ResponseCache
+from ml.decoding import DecodingPolicy
+from ml.sessions import InMemorySessionStore, SessionManager
+from rules.responses import DEFAULT_LANGUAGE, packs_from_env
+from rules.language_detection import detect_language
+from router import HybridRouter
+from metrics import CHAT_SECONDS, QUEUE_DEPTH, REQUEST_SECONDS, profiler_from_env, render_metrics
+from utils import REQUEST_ID, request_log_from_env, setup_logging_from_env
+
+# Log through a background writer before anything else logs (LOG_* settings)
+setup_logging_from_env()
+
+# Startup time to ready is measured from here
+STARTED_AT = time.perf_counter()
 
 app = FastAPI(title="Multilingual Chatbot API")
 
@@ -15,28 +43,474 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize chatbot
-chatbot = MultilingualChatbot()
+# Opt-in profiler for slow requests (PROFILE_SLOW_REQUEST_MS)
+profiler = profiler_from_env()
+
+# Opt-in sampled JSON request log (REQUEST_LOG_PATH)
+request_log = request_log_from_env()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Log records written while handling the request carry its ID
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    REQUEST_ID.set(request_id)
+    start = time.perf_counter()
+    with profiler.profile(f"{request.method} {request.url.path}"):
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(
+        elapsed,
+        path=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    if request_log is not None:
+        request_log.log(
+            response.status_code,
+            method=request.method,
+            path=request.url.path,
+            duration_ms=round(elapsed * 1000, 2)
+        )
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# Initialize chatbot; the model loads in the background once the server is up.
+# With INFERENCE_WORKERS > 0 generation runs in that many pinned worker
+# processes sharing the mmap'd weights instead of in this process.
+# INFERENCE_BACKEND=onnx runs the ONNX Runtime export in ONNX_MODEL_PATH instead.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+if INFERENCE_BACKEND not in ("torch", "onnx"):
+    raise ValueError(f"Unsupported INFERENCE_BACKEND: {INFERENCE_BACKEND}")
+MODEL_PATH = (
+    os.getenv("ONNX_MODEL_PATH", "../../models/onnx/finetuned_mbart")
+    if INFERENCE_BACKEND == "onnx" else "../../models/pretrained/finetuned_mbart"
+)
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+if INFERENCE_WORKERS > 0:
+    chatbot = WorkerPool(
+        INFERENCE_WORKERS,
+        MODEL_PATH,
+        precision=INFERENCE_PRECISION,
+        cores_per_worker=int(os.getenv("WORKER_CORES", "0")) or None,
+        max_restarts=int(os.getenv("WORKER_MAX_RESTARTS", "5")),
+        use_mmap=os.getenv("MODEL_MMAP", "1") == "1",
+        backend=INFERENCE_BACKEND,
+    )
+else:
+    chatbot_class = OnnxChatbot if INFERENCE_BACKEND == "onnx" else MultilingualChatbot
+    chatbot = chatbot_class(
+        MODEL_PATH,
+        precision=INFERENCE_PRECISION,
+        num_threads=int(os.getenv("TORCH_NUM_THREADS", "0")) or None,
+        num_interop_threads=int(os.getenv("TORCH_NUM_INTEROP_THREADS", "0")) or None,
+        use_mmap=os.getenv("MODEL_MMAP", "1") == "1",
+        lazy=True,
+    )
+
+def _warmup_prompts():
+    """Warmup prompts per language: WARMUP_PROMPTS JSON file, or the built-in set."""
+    if os.getenv("WARMUP", "1") != "1":
+        return None
+    path = os.getenv("WARMUP_PROMPTS")
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return VALIDATION_PROMPTS
+
+loader = BackgroundLoader(
+    chatbot,
+    warmup_prompts=_warmup_prompts(),
+    warmup_beam_sizes=[int(b) for b in os.getenv("WARMUP_BEAMS", "1,5").split(",")],
+    started_at=STARTED_AT,
+)
+
+# Adaptive decoding policy, fed with step timings by the batching engine
+DECODING_QUEUE_SOFT_LIMIT = int(os.getenv("DECODING_QUEUE_SOFT_LIMIT", "16"))
+if DECODING_QUEUE_SOFT_LIMIT < 1:
+    raise ValueError("DECODING_QUEUE_SOFT_LIMIT must be at least 1")
+policy = DecodingPolicy(
+    queue_soft_limit=DECODING_QUEUE_SOFT_LIMIT,
+    min_max_length=int(os.getenv("DECODING_MIN_MAX_LENGTH", "16")),
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "8")),
+)
+
+# Micro-batching engine in front of the chatbot
+engine = BatchingEngine(
+    chatbot,
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "8")),
+    max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "10")),
+    max_batch_tokens=int(os.getenv("BATCH_MAX_TOKENS", "4096")),
+    max_concurrent_batches=max(INFERENCE_WORKERS, 1),
+    policy=policy,
+    max_queue_depth=int(os.getenv("MAX_QUEUE_DEPTH", "0")) or None,
+)
+policy.queue_depth = engine.queue_depth
+QUEUE_DEPTH.set_function(engine.queue_depth)
+
+# Batch size for bulk /chat/batch requests, which bypass the batching queue
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "32"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Default per-request deadline, overridable per request with deadline_ms
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "0")) or None
+
+# Response cache in front of the batching engine
+cache = ResponseCache(
+    engine,
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS")) if os.getenv("CACHE_TTL_SECONDS") else None,
+    persist_path=os.getenv("CACHE_PATH") or None,
+    # Persisted replies are dropped when the model, precision or backend changes
+    fingerprint=f"{checkpoint_hash(MODEL_PATH)}:{INFERENCE_PRECISION}:{INFERENCE_BACKEND}",
+)
+
+# Multi-turn sessions: recent turns per session are the model's context
+sessions = SessionManager(
+    chatbot,
+    InMemorySessionStore(
+        max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")),
+        ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "1800")) or None,
+        max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+    ),
+    max_turns=int(os.getenv("SESSION_MAX_TURNS", "8")),
+    max_context_tokens=int(os.getenv("SESSION_MAX_TOKENS", "512")),
+)
+
+# "model" sends every message to the model; "hybrid" answers rule-engine
+# hits directly and only falls through to the model on a miss
+SERVING_MODE = os.getenv("SERVING_MODE", "model")
+# Rule-engine response packs, reloaded when their files change (RESPONSE_PACKS_*)
+rule_packs = packs_from_env() if SERVING_MODE == "hybrid" else {}
+router = HybridRouter(
+    rule_packs,
+    cache,
+    chatbot.get_supported_languages(),
+    policy=policy,
+    sessions=sessions,
+)
 
 class ChatMessage(BaseModel):
     message: str
-    language: str
+    language: Optional[str] = None  # detected from the message when omitted
+    latency_budget_ms: Optional[float] = None
+    quality: Optional[Literal["fast", "balanced", "best"]] = None
+    deadline_ms: Optional[float] = None
+    session_id: Optional[str] = None  # continue a multi-turn conversation
+
+@app.on_event("startup")
+async def start_engine():
+    await engine.start()
+    loader.start()
+
+@app.on_event("shutdown")
+async def stop_engine():
+    await engine.stop()
+    cache.close()
+    if INFERENCE_WORKERS > 0:
+        chatbot.close()
+    if SERVING_MODE == "hybrid":
+        rule_packs.close()
 
 @app.post("/chat")
 async def chat(chat_message: ChatMessage):
+    language = _language(chat_message)
+    deadline = _deadline(chat_message)
+    session = sessions.get(chat_message.session_id) if chat_message.session_id else None
     try:
-        response = chatbot.generate_response(
+        start = time.perf_counter()
+        response, tier = await router.route(
             chat_message.message,
-            chat_message.language
+            language,
+            latency_budget_ms=chat_message.latency_budget_ms,
+            quality=chat_message.quality,
+            deadline=deadline,
+            session=session
         )
-        return {"response": response, "language": chat_message.language}
+        CHAT_SECONDS.observe(
+            time.perf_counter() - start, tier=tier, language=router.metric_language(language)
+        )
+        result = {
+            "response": response,
+            "language": language,
+            "tier": tier
+        }
+        if session is not None:
+            result["session_id"] = session.session_id
+            result["turns"] = len(session.turns)
+        return result
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=_retry_after(e))
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=_retry_after(e))
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _language(chat_message: ChatMessage) -> str:
+    """Return the requested language, detecting it when the client omitted it.
+
+    Undetectable messages fall back to the rule engine's default language
+    when it is served, and are rejected with 422 otherwise.
+    """
+    if chat_message.language:
+        return chat_message.language
+    supported = router.supported_languages()
+    language = detect_language(
+        chat_message.message,
+        supported,
+        default=DEFAULT_LANGUAGE if DEFAULT_LANGUAGE in supported else None
+    )
+    if language is None:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Could not detect a supported language; set 'language' to one of {supported}"
+        )
+    return language
+
+def _deadline(chat_message: ChatMessage) -> Optional[float]:
+    """Return the request's ``time.monotonic()`` deadline, if it has one."""
+    deadline_ms = chat_message.deadline_ms or REQUEST_DEADLINE_MS
+    return time.monotonic() + deadline_ms / 1000.0 if deadline_ms else None
+
+def _positive_int(options: dict, key: str, default: int) -> int:
+    """Read a positive integer option, raising ValueError for anything else."""
+    value = options.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"'{key}' must be a positive integer")
+    return value
+
+def _retry_after(error: OverloadedError) -> dict:
+    return {"Retry-After": str(math.ceil(error.retry_after))}
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(chat_message: ChatMessage, request: Request):
+    """Stream a reply as Server-Sent Events.
+
+    Each ``data`` event carries a ``token`` chunk; a final ``done`` event
+    carries the full response and the tier that answered it. Model streams
+    take one of the batching engine's generation slots, pass its admission
+    control and stop at the request deadline.
+    """
+    message, language = chat_message.message, _language(chat_message)
+    session = sessions.get(chat_message.session_id) if chat_message.session_id else None
+    deadline = _deadline(chat_message)
+    stop_event = threading.Event()
+
+    response, message_ids = router.match_rules(message, language), None
+    if response is not None:
+        tier = "rules"
+    else:
+        try:
+            chatbot.require_ready()
+            if language not in chatbot.language_codes:
+                raise ValueError(f"Unsupported language: {language}")
+            engine.admit(deadline)
+            model_input = message
+            if session is not None:
+                message_ids = sessions.tokenize(message)
+                model_input = sessions.context_ids(session, message, message_ids)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers=_retry_after(e))
+        except DeadlineExceededError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=_retry_after(e))
+        except ModelNotReadyError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        tier = "model"
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        parts = []
+        slot_held, timer = False, None
+        try:
+            if tier == "rules":
+                chunks = iter([response])
+            else:
+                await engine.acquire_slot(deadline)
+                slot_held = True
+                if deadline is not None:
+                    # Stop generating once the deadline passes, consumed or not
+                    timer = loop.call_later(max(deadline - time.monotonic(), 0), stop_event.set)
+                chunks = chatbot.stream_response(model_input, language, stop_event=stop_event)
+            while True:
+                if await request.is_disconnected():
+                    return
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                parts.append(chunk)
+                yield _sse({"token": chunk})
+            if deadline is not None and time.monotonic() >= deadline:
+                yield _sse({"detail": "Request deadline expired during generation"}, event="error")
+                return
+            if tier == "model":
+                router.record(tier, language)
+            done = {"response": "".join(parts), "language": language, "tier": tier}
+            if session is not None:
+                sessions.record(session, message, done["response"], message_ids)
+                done["session_id"] = session.session_id
+            yield _sse(done, event="done")
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+        finally:
+            # Stop generation if the client went away mid-stream
+            stop_event.set()
+            if timer is not None:
+                timer.cancel()
+            if slot_held:
+                engine.release_slot()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request):
+    """Generate replies for many messages in length-sorted padded batches.
+
+    The body is either JSON (a list of ``{message, language}`` items, or
+    ``{"items": [...], "max_length": ..., "num_beams": ...}``) or JSONL
+    (``application/x-ndjson``). Results stream back as JSONL in input
+    order, followed by a ``summary`` line with per-language throughput.
+    Each batch takes one of the batching engine's generation slots, so bulk
+    work shares the model with interactive requests and counts in their
+    queue and wait estimates.
+    """
+    content_type = request.headers.get("content-type", "")
+    options = {}
+    raw = bytearray()
+    async for chunk in request.stream():
+        raw.extend(chunk)
+        if len(raw) > BULK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {BULK_MAX_BYTES} bytes")
+    try:
+        body = raw.decode("utf-8")
+        if "ndjson" in content_type or "jsonl" in content_type:
+            items = parse_jsonl(body)
+        else:
+            data = json.loads(body)
+            if isinstance(data, dict):
+                items, options = data.get("items", []), data
+            else:
+                items = data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("Expected a list of {message, language} items")
+        if len(items) > BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=413, detail=f"At most {BULK_MAX_ITEMS} items per request"
+            )
+        for index, item in enumerate(items):
+            if not isinstance(item.get("message"), str):
+                raise ValueError(f"Item {index}: 'message' must be a string")
+            if not isinstance(item.get("language") or "", str):
+                raise ValueError(f"Item {index}: 'language' must be a string")
+        max_length = _positive_int(options, "max_length", 100)
+        num_beams = _positive_int(options, "num_beams", 5)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        chatbot.require_ready()
+        engine.admit()
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=_retry_after(e))
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    runner = BatchRunner(
+        chatbot,
+        batch_size=BULK_BATCH_SIZE,
+        concurrency=max(INFERENCE_WORKERS, 1),
+        call=engine.call_in_slot,
+        max_length=max_length,
+        num_beams=num_beams
+    )
+    results = runner.run(items)
+
+    async def lines():
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if await request.is_disconnected():
+                    return
+                result = await loop.run_in_executor(None, next, results, None)
+                if result is None:
+                    break
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+            yield json.dumps({"summary": runner.summary()}, ensure_ascii=False) + "\n"
+        finally:
+            # Stop generating for a client that went away
+            runner.cancel()
+            try:
+                results.close()
+            except ValueError:
+                # Still running a batch in the executor; cancel stops it after that batch
+                pass
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/health")
+async def health():
+    """Liveness: the server is up, whether or not the model has loaded."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the model is loaded and warmed up, 503 before."""
+    status = loader.status()
+    if not loader.ready:
+        return JSONResponse(status, status_code=503)
+    return status
+
+@app.get("/workers")
+async def get_workers():
+    if INFERENCE_WORKERS == 0:
+        return {"workers": []}
+    return chatbot.stats()
+
 @app.get("/supported-languages")
 async def get_supported_languages():
-    return {"languages": chatbot.get_supported_languages()}
+    return {"languages": router.supported_languages()}
+
+@app.get("/router/stats")
+async def get_router_stats():
+    return router.stats()
+
+@app.get("/queue/stats")
+async def get_queue_stats():
+    return engine.stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return cache.stats()
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return sessions.stats()
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    session = sessions.store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "turns": session.history()}
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "deleted": True}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000) 
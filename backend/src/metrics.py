@@ -0,0 +1,383 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond rule matches to long decodes
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric(ABC):
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for every labeled value of this metric."""
+
+    def drain(self) -> Dict:
+        """Return and reset accumulated values (counters and histograms only)."""
+        return {}
+
+    def merge(self, values: Dict):
+        """Add values drained from the same metric in another process."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally labeled."""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def drain(self) -> Dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time."""
+
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabeled) value with ``function`` on every scrape."""
+        self._function = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._function is not None:
+            try:
+                values[()] = self._function()
+            except Exception:
+                pass
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket boundaries."""
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: per-bucket counts (non-cumulative), sum and count
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def drain(self) -> Dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                entry = self._values.get(key)
+                if entry is None:
+                    entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+REGISTRY: List[_Metric] = []
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+def drain_samples() -> Dict[str, Dict]:
+    """Return and reset this process's counter and histogram values."""
+    drained = {metric.name: metric.drain() for metric in REGISTRY}
+    return {name: values for name, values in drained.items() if values}
+
+def merge_samples(samples: Dict[str, Dict]):
+    """Merge values drained in another process, e.g. an inference worker."""
+    metrics = {metric.name: metric for metric in REGISTRY}
+    for name, values in samples.items():
+        if name in metrics:
+            metrics[name].merge(values)
+
+def _resident_memory_bytes() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+# Request level
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds", "HTTP request latency.", ("path", "status")
+)
+CHAT_SECONDS = Histogram(
+    "chatbot_chat_seconds", "Chat reply latency by answering tier.", ("tier", "language")
+)
+RULE_MATCHES = Counter(
+    "chatbot_rule_matches_total", "Rule-engine matches by rule category.", ("category", "language")
+)
+
+# Model pipeline
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds", "Model pipeline stage latency.", ("stage", "language")
+)
+OUTPUT_TOKENS = Counter(
+    "chatbot_output_tokens_total", "Tokens generated by the model.", ("language",)
+)
+OUTPUT_TOKENS_PER_SECOND = Histogram(
+    "chatbot_output_tokens_per_second", "Generated tokens per second per batch.", ("language",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "chatbot_queue_wait_seconds", "Time requests wait in the batching queue.", ("language",)
+)
+SHED_REQUESTS = Counter(
+    "chatbot_shed_requests_total", "Requests rejected or dropped by admission control.", ("reason",)
+)
+BATCH_SIZE = Histogram(
+    "chatbot_batch_size", "Requests per generated batch.", ("language",),
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+QUEUE_DEPTH = Gauge(
+    "chatbot_queue_depth", "Requests waiting in the batching queue."
+)
+MODEL_MEMORY_BYTES = Gauge(
+    "chatbot_model_memory_bytes", "Memory held by model parameters and buffers."
+)
+STARTUP_SECONDS = Gauge(
+    "chatbot_startup_seconds", "Model load, warmup and total time to ready.", ("phase",)
+)
+PROCESS_MEMORY_BYTES = Gauge(
+    "chatbot_process_resident_memory_bytes", "Resident memory of the server process.",
+    function=_resident_memory_bytes
+)
+
+class SlowRequestProfiler:
+    """Opt-in sampling profiler that reports where slow requests spend time.
+
+    A ``sample_rate`` fraction of requests is profiled. While any profiled
+    request is in flight, a background thread samples the stacks of all
+    threads every ``interval_ms`` (so work handed to executor threads is
+    seen too). When a profiled request takes at least ``threshold_ms``, its
+    hottest stacks are logged and, with ``output_dir``, written as folded
+    stacks that flame graph tools can read.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: Optional[float] = None,
+        sample_rate: float = 0.1,
+        interval_ms: float = 5.0,
+        output_dir: Optional[str] = None,
+        top_stacks: int = 10
+    ):
+        self.threshold = threshold_ms / 1000.0 if threshold_ms is not None else None
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.top_stacks = top_stacks
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._active: Dict[int, _StackCounter] = {}
+        self._thread: Optional[threading.Thread] = None
+        # Folded-stack files are written off the request path
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold is not None
+
+    @contextmanager
+    def profile(self, name: str):
+        """Profile the ``with`` block if profiling is on and it is sampled."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            yield
+            return
+
+        stacks = _StackCounter()
+        token = id(stacks)
+        with self._lock:
+            self._active[token] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, daemon=True)
+                self._thread.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._active.pop(token, None)
+            if elapsed >= self.threshold:
+                self._report(name, elapsed, stacks)
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.values())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = ";".join(
+                    f"{os.path.basename(f.filename)}:{f.name}"
+                    for f in traceback.extract_stack(frame)
+                )
+                for stacks in active:
+                    stacks[stack] += 1
+            time.sleep(self.interval)
+
+    def _report(self, name: str, elapsed: float, stacks: _StackCounter):
+        top = stacks.most_common(self.top_stacks)
+        summary = "\n".join(f"  {count} samples: {stack}" for stack, count in top)
+        self.logger.warning(f"Slow request {name} took {elapsed * 1000:.1f} ms\n{summary}")
+        if self.output_dir:
+            path = os.path.join(
+                self.output_dir, f"slow_{time.strftime('%Y%m%d_%H%M%S')}_{id(stacks)}.folded"
+            )
+            with self._lock:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+                self._writer.submit(self._write, path, dict(stacks))
+
+    def _write(self, path: str, stacks: Dict[str, int]):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.items():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            self.logger.error(f"Error writing profile {path}: {str(e)}")
+
+def profiler_from_env() -> SlowRequestProfiler:
+    """Build the slow-request profiler from PROFILE_* environment variables."""
+    threshold = os.getenv("PROFILE_SLOW_REQUEST_MS")
+    return SlowRequestProfiler(
+        threshold_ms=float(threshold) if threshold else None,
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0.1")),
+        output_dir=os.getenv("PROFILE_OUTPUT_DIR") or None
+    )
@@ -0,0 +1,219 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from rules.language_detection import detect_language
+
+def read_items(path: str) -> Iterator[Dict]:
+    """Read ``{message, language}`` items from a JSON list or a JSONL file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def parse_jsonl(text: str) -> List[Dict]:
+    """Parse JSONL text into items, skipping blank lines."""
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+class BatchRunner:
+    """Run many messages through the model in length-sorted padded batches.
+
+    Items are read in windows of ``window_size``. Within a window they are
+    grouped by language and sorted by token length, so each ``generate``
+    call pads a batch of similar lengths up to ``batch_size`` items or
+    ``max_batch_tokens`` padded tokens. Results are yielded in input order,
+    one window at a time, and per-language throughput is accumulated.
+
+    With ``concurrency`` > 1 a language's batches are generated that many at
+    a time, e.g. one per process of a WorkerPool. Each result carries the
+    ``latency_ms`` of the batch that generated it. ``call`` wraps every
+    ``generate_batch`` call, e.g. to hold a serving slot while it runs.
+    ``cancel`` stops the run before the next batch.
+    """
+
+    def __init__(
+        self,
+        chatbot,
+        batch_size: int = 32,
+        max_batch_tokens: int = 8192,
+        window_size: int = 1024,
+        concurrency: int = 1,
+        call: Optional[Callable] = None,
+        **generation_kwargs
+    ):
+        self.chatbot = chatbot
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.window_size = window_size
+        self.concurrency = concurrency
+        self.generation_kwargs = generation_kwargs
+        self.call = call
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = defaultdict(
+            lambda: {"items": 0, "errors": 0, "batches": 0, "output_tokens": 0, "seconds": 0.0}
+        )
+
+    def run(self, items: Iterable[Dict]) -> Iterator[Dict]:
+        """Yield ``{index, message, language, response | error}`` in input order."""
+        window: List[Dict] = []
+        for index, item in enumerate(items):
+            message = item.get("message", "")
+            window.append({
+                "index": index,
+                "message": message,
+                # Items without a language get it detected from the message
+                "language": item.get("language") or detect_language(
+                    message, self.chatbot.language_codes, default=None
+                ),
+            })
+            if len(window) >= self.window_size:
+                yield from self._run_window(window)
+                window = []
+        if window:
+            yield from self._run_window(window)
+
+    def _run_window(self, window: List[Dict]) -> List[Dict]:
+        by_language: Dict[str, List[Dict]] = defaultdict(list)
+        for result in window:
+            language = result["language"]
+            if language is None:
+                result["error"] = "Could not detect a supported language"
+                self._stats["unknown"]["errors"] += 1
+            elif language not in self.chatbot.language_codes:
+                result["error"] = f"Unsupported language: {language}"
+                self._stats[str(language)]["errors"] += 1
+            else:
+                by_language[language].append(result)
+
+        for language, results in by_language.items():
+            lengths = [
+                len(ids) for ids in self.chatbot.tokenizer(
+                    [r["message"] for r in results], truncation=True, max_length=512
+                )["input_ids"]
+            ]
+            order = sorted(range(len(results)), key=lengths.__getitem__)
+            batches = [[results[i] for i in batch] for batch in self._batches(order, lengths)]
+            start = time.perf_counter()
+            if self.concurrency > 1 and len(batches) > 1:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                    list(pool.map(partial(self._generate, language), batches))
+            else:
+                for batch in batches:
+                    self._generate(language, batch)
+            # Wall time, so throughput reflects concurrent batches
+            self._stats[language]["seconds"] += time.perf_counter() - start
+        return window
+
+    def _batches(self, order: List[int], lengths: List[int]) -> Iterator[List[int]]:
+        """Cut length-sorted indices into batches within both budgets."""
+        batch: List[int] = []
+        for i in order:
+            # Sorted ascending, so the newest item is the longest in the batch
+            if batch and (
+                len(batch) >= self.batch_size
+                or (len(batch) + 1) * lengths[i] > self.max_batch_tokens
+            ):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def cancel(self):
+        """Stop generating; items not yet generated get an error."""
+        self._cancelled.set()
+
+    def _generate(self, language: str, results: List[Dict]):
+        start = time.perf_counter()
+        try:
+            if self._cancelled.is_set():
+                raise RuntimeError("Batch run cancelled")
+            args = ([r["message"] for r in results], language)
+            if self.call is not None:
+                responses = self.call(self.chatbot.generate_batch, *args, **self.generation_kwargs)
+            else:
+                responses = self.chatbot.generate_batch(*args, **self.generation_kwargs)
+        except Exception as e:
+            for result in results:
+                result["error"] = str(e)
+            with self._lock:
+                self._stats[language]["errors"] += len(results)
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        output_tokens = sum(
+            len(ids) for ids in self.chatbot.tokenizer(responses, add_special_tokens=False)["input_ids"]
+        )
+        with self._lock:
+            stats = self._stats[language]
+            stats["batches"] += 1
+            stats["items"] += len(results)
+            stats["output_tokens"] += output_tokens
+        for result, response in zip(results, responses):
+            result["response"] = response
+            result["latency_ms"] = latency_ms
+
+    def summary(self) -> Dict[str, Dict]:
+        """Return per-language item counts and throughput so far."""
+        summary = {}
+        for language, stats in self._stats.items():
+            seconds = stats["seconds"]
+            summary[language] = {
+                **stats,
+                "items_per_second": stats["items"] / seconds if seconds else 0.0,
+                "output_tokens_per_second": stats["output_tokens"] / seconds if seconds else 0.0,
+            }
+        return summary
+
+if __name__ == "__main__":
+    from ml.inference import MultilingualChatbot
+
+    parser = argparse.ArgumentParser(
+        description="Generate replies for a JSON list or JSONL file of {message, language} items."
+    )
+    parser.add_argument("input", help="JSON list or .jsonl file of items")
+    parser.add_argument("--output", default=None, help="JSONL results file (default: stdout)")
+    parser.add_argument("--model-path", default="../../models/pretrained/finetuned_mbart")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--num-beams", type=int, default=5)
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=0, help="Generate in this many worker processes")
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        from ml.workers import WorkerPool
+        chatbot = WorkerPool(args.workers, args.model_path, precision=args.precision)
+        chatbot.load()
+    else:
+        chatbot = MultilingualChatbot(args.model_path, precision=args.precision, num_threads=args.threads)
+    runner = BatchRunner(
+        chatbot,
+        concurrency=max(args.workers, 1),
+        batch_size=args.batch_size,
+        max_batch_tokens=args.max_batch_tokens,
+        max_length=args.max_length,
+        num_beams=args.num_beams
+    )
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for result in runner.run(read_items(args.input)):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if args.output:
+            output.close()
+        if args.workers > 0:
+            chatbot.close()
+    print(json.dumps(runner.summary(), indent=2), file=sys.stderr)
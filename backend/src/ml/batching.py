@@ -0,0 +1,409 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from metrics import BATCH_SIZE, QUEUE_WAIT_SECONDS, SHED_REQUESTS
+
+class OverloadedError(RuntimeError):
+    """Raised when a request is shed; ``retry_after`` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class QueueFullError(OverloadedError):
+    """The batching queue is at its maximum depth."""
+
+class DeadlineExceededError(OverloadedError):
+    """The request cannot be, or was not, answered before its deadline."""
+
+class _PendingRequest:
+    """A queued request waiting for its batch to be generated."""
+
+    __slots__ = ("input_text", "num_tokens", "future", "deadline", "enqueued_at")
+
+    def __init__(
+        self,
+        input_text: Union[str, List[int]],
+        num_tokens: int,
+        future: asyncio.Future,
+        deadline: Optional[float] = None
+    ):
+        self.input_text = input_text
+        self.num_tokens = num_tokens
+        self.future = future
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+
+class BatchingEngine:
+    """Dynamic micro-batching in front of a MultilingualChatbot.
+
+    Requests are grouped by target language and generation parameters. A group
+    is dispatched as one padded ``generate_batch`` call once it reaches
+    ``max_batch_size``, once its padded size reaches ``max_batch_tokens``, or
+    once its oldest request has waited ``max_wait_ms``. Generation runs in a
+    worker thread so the event loop keeps accepting requests, and requests
+    keep accumulating while the model is busy. When a decoding policy is
+    given, every batch's per-step decoding time is reported to it.
+
+    Admission control keeps latency bounded under overload: with
+    ``max_queue_depth`` new requests are rejected once that many are
+    queued, requests whose deadline cannot be met given the current queue
+    and the observed batch latency are rejected up front, and requests
+    whose deadline passes while queued are dropped without being generated.
+
+    Work that cannot be batched, such as streaming, takes one of the same
+    ``max_concurrent_batches`` slots with ``acquire_slot``, after the same
+    admission checks.
+    """
+
+    def __init__(
+        self,
+        chatbot,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_batch_tokens: int = 4096,
+        max_concurrent_batches: int = 1,
+        policy=None,
+        max_queue_depth: Optional[int] = None,
+        smoothing: float = 0.2
+    ):
+        self.chatbot = chatbot
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_queue_depth = max_queue_depth
+        self.smoothing = smoothing
+        self.logger = logging.getLogger(__name__)
+
+        self._batch_seconds: Optional[float] = None
+        self._running = 0
+        self._shed = {"queue_full": 0, "deadline": 0, "expired": 0}
+
+        self._groups: "OrderedDict[Tuple, Deque[_PendingRequest]]" = OrderedDict()
+        self._wakeup = None
+        self._slots = None
+        self._executor = None
+        self._task = None
+        self._loop = None
+
+    async def start(self):
+        """Start the dispatcher loop on the running event loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_batches,
+            thread_name_prefix="generate"
+        )
+        self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop the dispatcher and fail any requests still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        for group in self._groups.values():
+            for request in group:
+                if not request.future.done():
+                    request.future.set_exception(RuntimeError("Batching engine stopped"))
+        self._groups.clear()
+        self._executor.shutdown(wait=False)
+
+    async def submit(
+        self,
+        input_text: Union[str, List[int]],
+        language: str,
+        max_length: int = 100,
+        num_beams: int = 5,
+        temperature: float = 0.7,
+        deadline: Optional[float] = None
+    ) -> str:
+        """Queue a request and wait for its generated response.
+
+        ``input_text`` may also be token ids, e.g. a session's context.
+        ``deadline`` is a ``time.monotonic()`` timestamp. Raises
+        QueueFullError or DeadlineExceededError when the request is shed.
+        """
+        if self._task is None:
+            raise RuntimeError("Batching engine is not running")
+        self.chatbot.require_ready()
+        if language not in self.chatbot.language_codes:
+            raise ValueError(f"Unsupported language: {language}")
+        self.admit(deadline)
+
+        if isinstance(input_text, str):
+            num_tokens = len(self.chatbot.tokenizer(
+                input_text,
+                truncation=True,
+                max_length=512
+            )["input_ids"])
+        else:
+            num_tokens = len(input_text)
+        future = asyncio.get_running_loop().create_future()
+
+        key = (language, max_length, num_beams, temperature)
+        self._groups.setdefault(key, deque()).append(
+            _PendingRequest(input_text, num_tokens, future, deadline)
+        )
+        self._wakeup.set()
+        if deadline is None:
+            return await future
+        try:
+            # Cancelling the future drops the request if it is still queued
+            return await asyncio.wait_for(future, max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self._shed_request("expired")
+            raise DeadlineExceededError(
+                "Request deadline expired before a reply was generated",
+                retry_after=max(self.estimated_wait(), 1.0)
+            )
+
+    def queue_depth(self) -> int:
+        """Return the number of requests waiting to be batched."""
+        return sum(
+            1 for group in self._groups.values() for request in group
+            if not request.future.done()
+        )
+
+    def estimated_wait(self, queued: Optional[int] = None) -> float:
+        """Estimate seconds until a newly queued request is answered.
+
+        Counts the batches ahead of it (queued plus running) at the observed
+        average batch latency, spread over the concurrent batch slots.
+        """
+        if self._batch_seconds is None:
+            return 0.0
+        queued = self.queue_depth() if queued is None else queued
+        batches_ahead = -(-(queued + 1) // self.max_batch_size) + self._running
+        rounds = -(-batches_ahead // self.max_concurrent_batches)
+        return rounds * self._batch_seconds
+
+    def admit(self, deadline: Optional[float] = None):
+        """Raise QueueFullError or DeadlineExceededError if a new request must be shed."""
+        depth = self.queue_depth()
+        if self.max_queue_depth and depth >= self.max_queue_depth:
+            self._shed_request("queue_full")
+            raise QueueFullError(
+                f"Request queue is full ({depth} waiting)",
+                retry_after=max(self.estimated_wait(depth), 1.0)
+            )
+        if deadline is not None:
+            wait = self.estimated_wait(depth)
+            if time.monotonic() + wait > deadline:
+                self._shed_request("deadline")
+                raise DeadlineExceededError(
+                    f"Request would miss its deadline (estimated wait {wait * 1000:.0f} ms)",
+                    retry_after=max(wait, 1.0)
+                )
+
+    async def acquire_slot(self, deadline: Optional[float] = None):
+        """Wait for a generation slot, but not past ``deadline``.
+
+        The caller must ``release_slot`` when done. Raises
+        DeadlineExceededError if no slot frees up in time.
+        """
+        if self._task is None:
+            raise RuntimeError("Batching engine is not running")
+        try:
+            if deadline is None:
+                await self._slots.acquire()
+            else:
+                await asyncio.wait_for(self._slots.acquire(), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            self._shed_request("expired")
+            raise DeadlineExceededError(
+                "Request deadline expired while waiting for the model",
+                retry_after=max(self.estimated_wait(), 1.0)
+            )
+        self._running += 1
+
+    def release_slot(self):
+        """Release a slot taken with ``acquire_slot``."""
+        self._running -= 1
+        self._slots.release()
+
+    def call_in_slot(self, function: Callable, *args, **kwargs):
+        """Run ``function`` on the calling thread while holding a generation slot.
+
+        For work outside the event loop, e.g. bulk batches; it waits for a
+        slot like any batch and counts as running while it holds one.
+        """
+        asyncio.run_coroutine_threadsafe(self.acquire_slot(), self._loop).result()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._loop.call_soon_threadsafe(self.release_slot)
+
+    def _shed_request(self, reason: str):
+        self._shed[reason] += 1
+        SHED_REQUESTS.inc(reason=reason)
+
+    def stats(self) -> Dict:
+        """Return queue depth, estimated wait and shed request counts."""
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "running_batches": self._running,
+            "estimated_wait_ms": self.estimated_wait() * 1000,
+            "batch_ms": self._batch_seconds * 1000 if self._batch_seconds is not None else None,
+            "shed": dict(self._shed),
+        }
+
+    async def _dispatch_loop(self):
+        while True:
+            # Take a slot only once requests are queued, so idle slots stay free for streams
+            await self._wait_for_requests()
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if batch is None:
+                self._slots.release()
+                continue
+            asyncio.create_task(self._run_batch(*batch))
+
+    async def _wait_for_requests(self):
+        while True:
+            self._drop_cancelled()
+            if self._groups:
+                return
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _next_batch(self) -> Optional[Tuple[Tuple, List[_PendingRequest]]]:
+        """Wait until any group is full or the oldest request hits max wait.
+
+        Full groups go first, oldest first. Returns None if the queue
+        empties in the meantime.
+        """
+        def oldest(k):
+            return self._groups[k][0].enqueued_at
+
+        while True:
+            self._drop_cancelled()
+            if not self._groups:
+                return None
+
+            full = [k for k, group in self._groups.items() if self._is_full(group)]
+            if full:
+                key = min(full, key=oldest)
+                return key, self._take(key)
+
+            key = min(self._groups, key=oldest)
+            remaining = oldest(key) + self.max_wait - time.monotonic()
+            if remaining <= 0:
+                return key, self._take(key)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _drop_cancelled(self):
+        """Drop cancelled and expired requests anywhere in the queue."""
+        for key in list(self._groups):
+            group = self._groups[key]
+            if any(request.future.done() for request in group):
+                group = self._groups[key] = deque(r for r in group if not r.future.done())
+            if not group:
+                del self._groups[key]
+
+    def _padded_tokens(self, requests) -> int:
+        return len(requests) * max(request.num_tokens for request in requests)
+
+    def _is_full(self, group: Deque[_PendingRequest]) -> bool:
+        if len(group) >= self.max_batch_size:
+            return True
+        return self._padded_tokens(group) >= self.max_batch_tokens
+
+    def _take(self, key: Tuple) -> List[_PendingRequest]:
+        """Pop the next batch for ``key`` within the size and token budgets."""
+        group = self._groups[key]
+        batch: List[_PendingRequest] = []
+        longest = 0
+        while group and len(batch) < self.max_batch_size:
+            request = group[0]
+            if request.future.done():
+                group.popleft()
+                continue
+            longest_if_added = max(longest, request.num_tokens)
+            if batch and (len(batch) + 1) * longest_if_added > self.max_batch_tokens:
+                break
+            batch.append(group.popleft())
+            longest = longest_if_added
+        if not group:
+            del self._groups[key]
+        return batch
+
+    def _observe(self, num_beams: int, token_counts: List[int], seconds: float):
+        # Decoding steps are bounded by the longest output; its decoder start token is not a step
+        steps = max(max(token_counts) - 1, 1)
+        self.policy.observe(num_beams, steps, seconds, batch_size=len(token_counts))
+
+    async def _run_batch(self, key: Tuple, batch: List[_PendingRequest]):
+        language, max_length, num_beams, temperature = key
+        loop = asyncio.get_running_loop()
+        running = False
+        try:
+            now = time.monotonic()
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                return
+            self._running += 1
+            running = True
+            for request in batch:
+                QUEUE_WAIT_SECONDS.observe(now - request.enqueued_at, language=language)
+            BATCH_SIZE.observe(len(batch), language=language)
+            # Generation is useless once every request in the batch has timed out
+            deadlines = [request.deadline for request in batch]
+            deadline = max(deadlines) if None not in deadlines else None
+            start = time.perf_counter()
+            outputs, token_counts = await loop.run_in_executor(
+                self._executor,
+                partial(
+                    self.chatbot.generate_batch,
+                    [request.input_text for request in batch],
+                    language,
+                    max_length=max_length,
+                    num_beams=num_beams,
+                    temperature=temperature,
+                    deadline=deadline,
+                    return_token_counts=True
+                )
+            )
+            elapsed = time.perf_counter() - start
+            self._batch_seconds = elapsed if self._batch_seconds is None else (
+                (1 - self.smoothing) * self._batch_seconds + self.smoothing * elapsed
+            )
+            if self.policy is not None:
+                self._observe(num_beams, token_counts, elapsed)
+            for request, output in zip(batch, outputs):
+                if not request.future.done():
+                    request.future.set_result(output)
+        except Exception as e:
+            self.logger.error(f"Error generating batch of {len(batch)}: {str(e)}")
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            if running:
+                self._running -= 1
+            self._slots.release()
@@ -0,0 +1,224 @@
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from torch.utils.data import DataLoader, Sampler
+from transformers import Seq2SeqTrainer, TrainerCallback
+
+class TokenBudgetBatchSampler(Sampler):
+    """Batch sampler grouping examples by length under a padded-token budget.
+
+    Examples are split by language and into length buckets of
+    ``bucket_width`` tokens. Each bucket is cut into batches whose padded
+    size stays within ``max_tokens``, so short greetings form large batches
+    and long dialogues small ones. Sources and targets are padded
+    separately, so a batch costs batch size x (longest source + longest
+    target); ``lengths`` are source lengths and ``target_lengths`` the
+    optional target lengths.
+
+    Languages are balanced by temperature sampling: a language with ``b``
+    batches gets a share of the epoch proportional to ``b ** (1 /
+    language_temperature)``. At 1 every batch is drawn once and the mix
+    follows the data. Higher temperatures flatten it: small languages'
+    batches repeat and large languages' are subsampled, with the epoch
+    length unchanged. Batches of different languages are interleaved, so
+    no language dominates a stretch of training. Examples within each
+    bucket and the order of batches are reshuffled for every epoch set
+    with ``set_epoch``.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        languages: Optional[Sequence[str]] = None,
+        target_lengths: Optional[Sequence[int]] = None,
+        max_tokens: int = 4096,
+        bucket_width: int = 8,
+        max_batch_size: Optional[int] = None,
+        shuffle: bool = True,
+        seed: int = 42,
+        language_temperature: float = 1.0
+    ):
+        if language_temperature <= 0:
+            raise ValueError("language_temperature must be positive")
+        self.source_lengths = list(lengths)
+        self.target_lengths = (
+            list(target_lengths) if target_lengths is not None else [0] * len(self.source_lengths)
+        )
+        self.lengths = [s + t for s, t in zip(self.source_lengths, self.target_lengths)]
+        self.languages = list(languages) if languages is not None else [None] * len(self.lengths)
+        self.max_tokens = max_tokens
+        self.bucket_width = bucket_width
+        self.max_batch_size = max_batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.language_temperature = language_temperature
+        self.epoch = 0
+        # accelerate inspects ``batch_sampler.sampler`` when preparing loaders
+        self.sampler = None
+
+        self._buckets: Dict = defaultdict(list)
+        for index, (length, language) in enumerate(zip(self.lengths, self.languages)):
+            self._buckets[(language, length // bucket_width)].append(index)
+        batch_counts: Dict = defaultdict(int)
+        for (language, _), indices in self._buckets.items():
+            batch_counts[language] += len(self._split(sorted(indices, key=self.lengths.__getitem__)))
+        self._draws = self._language_draws(batch_counts)
+        self._num_batches = sum(self._draws.values())
+
+    def _language_draws(self, batch_counts: Dict) -> Dict:
+        """Return how many batches each language contributes per epoch."""
+        if self.language_temperature == 1:
+            return dict(batch_counts)
+        weights = {
+            language: count ** (1 / self.language_temperature)
+            for language, count in batch_counts.items()
+        }
+        total_weight = sum(weights.values())
+        total = sum(batch_counts.values())
+        return {
+            language: max(1, round(total * weight / total_weight))
+            for language, weight in weights.items()
+        }
+
+    def _split(self, indices: List[int]) -> List[List[int]]:
+        """Cut length-sorted indices into batches within the token budget."""
+        batches, batch = [], []
+        longest_source = longest_target = 0
+        for index in indices:
+            source = max(longest_source, self.source_lengths[index])
+            target = max(longest_target, self.target_lengths[index])
+            too_many = self.max_batch_size and len(batch) >= self.max_batch_size
+            if batch and (too_many or (len(batch) + 1) * (source + target) > self.max_tokens):
+                batches.append(batch)
+                batch = []
+                source, target = self.source_lengths[index], self.target_lengths[index]
+            batch.append(index)
+            longest_source, longest_target = source, target
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def set_epoch(self, epoch: int):
+        """Select the epoch whose shuffle the next iteration uses."""
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return self._num_batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        rng = random.Random(self.seed + self.epoch)
+
+        batches_by_language: Dict = defaultdict(list)
+        for (language, _), indices in sorted(self._buckets.items(), key=lambda item: str(item[0])):
+            indices = list(indices)
+            if self.shuffle:
+                rng.shuffle(indices)
+            # Stable sort keeps the shuffled order among equal lengths
+            indices.sort(key=self.lengths.__getitem__)
+            batches_by_language[language].extend(self._split(indices))
+
+        for language, batches in batches_by_language.items():
+            if self.shuffle:
+                rng.shuffle(batches)
+            # Repeat (reshuffled) or cut the batches to the language's draw count
+            drawn_batches = list(batches)
+            while len(drawn_batches) < self._draws[language]:
+                extra = list(batches)
+                if self.shuffle:
+                    rng.shuffle(extra)
+                drawn_batches.extend(extra)
+            batches_by_language[language] = drawn_batches[:self._draws[language]]
+
+        # Interleave languages: always draw from the language furthest behind
+        # its share of the batches
+        totals = {language: len(batches) for language, batches in batches_by_language.items()}
+        drawn = {language: 0 for language in totals}
+        while any(drawn[language] < totals[language] for language in totals):
+            language = min(
+                (language for language in totals if drawn[language] < totals[language]),
+                key=lambda language: (drawn[language] + 1) / totals[language]
+            )
+            yield batches_by_language[language][drawn[language]]
+            drawn[language] += 1
+
+class _SetEpochCallback(TrainerCallback):
+    """Tell the batch sampler which epoch is starting."""
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.batch_sampler.set_epoch(int(state.epoch or 0))
+
+class TokenThroughputTrainer(Seq2SeqTrainer):
+    """Seq2SeqTrainer that reports token throughput and padding efficiency.
+
+    With a ``batch_sampler`` the training DataLoader draws batches from it
+    instead of using a fixed per-device batch size, and its ``set_epoch``
+    is called at the start of every epoch.
+    """
+
+    def __init__(self, *args, batch_sampler: Optional[Sampler] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_sampler = batch_sampler
+        if batch_sampler is not None and hasattr(batch_sampler, "set_epoch"):
+            self.add_callback(_SetEpochCallback(batch_sampler))
+        self.throughput_logger = logging.getLogger(__name__)
+        self._reset_token_counts()
+
+    def _reset_token_counts(self):
+        self._real_tokens = 0
+        self._padded_tokens = 0
+        self._window_start = time.perf_counter()
+
+    def get_train_dataloader(self) -> DataLoader:
+        self._reset_token_counts()
+        if self.batch_sampler is None:
+            return super().get_train_dataloader()
+
+        train_dataset = self._remove_unused_columns(self.train_dataset, description="training")
+        return self.accelerator.prepare(DataLoader(
+            train_dataset,
+            batch_sampler=self.batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        ))
+
+    def training_step(self, model, inputs):
+        self._real_tokens += int(inputs["attention_mask"].sum())
+        self._padded_tokens += inputs["input_ids"].numel()
+        if "labels" in inputs:
+            labels = inputs["labels"]
+            self._real_tokens += int((labels != -100).sum())
+            self._padded_tokens += labels.numel()
+        return super().training_step(model, inputs)
+
+    def log(self, logs: Dict[str, float]):
+        if "loss" in logs and self._padded_tokens:
+            elapsed = time.perf_counter() - self._window_start
+            logs["tokens_per_second"] = round(self._real_tokens / elapsed, 2)
+            logs["padding_efficiency"] = round(self._real_tokens / self._padded_tokens, 4)
+            self.throughput_logger.info(
+                f"step {self.state.global_step}: "
+                f"{logs['tokens_per_second']} tokens/sec, "
+                f"padding efficiency {logs['padding_efficiency']:.1%}"
+            )
+            self._reset_token_counts()
+        super().log(logs)
+
+def example_lengths(dataset, batch_size: int = 10000):
+    """Return per-example source token lengths, target token lengths and languages."""
+    source_lengths, target_lengths, languages = [], [], []
+    columns = [c for c in ("input_ids", "labels", "language") if c in dataset.column_names]
+    for batch in dataset.select_columns(columns).iter(batch_size=batch_size):
+        source_lengths.extend(len(input_ids) for input_ids in batch["input_ids"])
+        if "labels" in batch:
+            target_lengths.extend(len(labels) for labels in batch["labels"])
+        else:
+            target_lengths.extend([0] * len(batch["input_ids"]))
+        languages.extend(batch.get("language", [None] * len(batch["input_ids"])))
+    return source_lengths, target_lengths, languages
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Normalize input text for cache lookups (NFC, collapsed whitespace)."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+class ResponseCache:
+    """Response cache in front of an engine exposing ``submit``.
+
+    Entries are keyed on normalized input text, target language and the
+    generation parameters. The in-memory tier is a size-bounded LRU with an
+    optional TTL; an optional SQLite file adds a persistent tier that survives
+    restarts. Concurrent misses for the same key share a single generation.
+
+    ``fingerprint`` identifies the model that generated the responses (e.g.
+    checkpoint hash, precision and backend). It is stored with the persistent
+    tier, which is cleared when a different model opens it.
+
+    SQLite is only touched from one background thread: disk lookups are
+    awaited off the event loop, and stores are queued and committed in
+    batches.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        persist_path: Optional[str] = None,
+        fingerprint: Optional[str] = None
+    ):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "deduplicated": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+        self._db = None
+        self._db_executor = None
+        self._pending: List[Tuple[str, str, float]] = []
+        self._pending_lock = threading.Lock()
+        if persist_path:
+            directory = os.path.dirname(persist_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._check_fingerprint(fingerprint)
+            self._db.commit()
+            self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+
+    def _check_fingerprint(self, fingerprint: Optional[str]):
+        """Drop persisted responses generated by a different model."""
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        stored = row[0] if row is not None else None
+        if stored == fingerprint:
+            return
+        if stored is not None:
+            self.logger.info("Model changed; clearing the persistent response cache")
+        self._db.execute("DELETE FROM responses")
+        if fingerprint is None:
+            self._db.execute("DELETE FROM meta WHERE name = 'fingerprint'")
+        else:
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (fingerprint,)
+            )
+
+    @staticmethod
+    def make_key(
+        input_text: str,
+        language: str,
+        max_length: int,
+        num_beams: int,
+        temperature: float
+    ) -> Tuple:
+        return (normalize_text(input_text), language, max_length, num_beams, float(temperature))
+
+    async def submit(
+        self,
+        input_text: Union[str, List[int]],
+        language: str,
+        max_length: int = 100,
+        num_beams: int = 5,
+        temperature: float = 0.7,
+        deadline: Optional[float] = None
+    ) -> str:
+        """Return a cached response or generate one through the engine.
+
+        ``deadline`` is passed to the engine for its admission control; a
+        deduplicated request shares the deadline of the first one. Token id
+        inputs (a session's context) depend on the conversation and are
+        passed straight to the engine.
+        """
+        if not isinstance(input_text, str):
+            return await self.engine.submit(
+                input_text,
+                language,
+                max_length=max_length,
+                num_beams=num_beams,
+                temperature=temperature,
+                deadline=deadline
+            )
+        key = self.make_key(input_text, language, max_length, num_beams, temperature)
+        response = await self.get(key)
+        if response is not None:
+            return response
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._counters["deduplicated"] += 1
+        else:
+            self._counters["misses"] += 1
+            inflight = asyncio.ensure_future(self.engine.submit(
+                input_text,
+                language,
+                max_length=max_length,
+                num_beams=num_beams,
+                temperature=temperature,
+                deadline=deadline
+            ))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._finish(key, task))
+        # Shield so one caller going away does not cancel the shared generation
+        return await asyncio.shield(inflight)
+
+    def _finish(self, key: Tuple, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    async def get(self, key: Tuple) -> Optional[str]:
+        """Look a key up in memory, then on disk. Returns None on a miss."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, created = entry
+            if self._expired(created, now):
+                del self._entries[key]
+                self._counters["expirations"] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return response
+
+        if self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(
+                self._db_executor, self._read, self._db_key(key)
+            )
+            if row is not None:
+                response, created = row
+                if not self._expired(created, now):
+                    self._counters["disk_hits"] += 1
+                    self._remember(key, response, created)
+                    return response
+        return None
+
+    def put(self, key: Tuple, response: str):
+        """Store a response in memory and queue it for the disk tier, if enabled."""
+        created = time.time()
+        self._remember(key, response, created)
+        if self._db is not None:
+            with self._pending_lock:
+                self._pending.append((self._db_key(key), response, created))
+                # One flush is queued per batch; later stores join the pending batch
+                if len(self._pending) == 1:
+                    self._db_executor.submit(self._flush)
+
+    def _read(self, db_key: str) -> Optional[Tuple[str, float]]:
+        try:
+            return self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (db_key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error reading cached response: {str(e)}")
+            return None
+
+    def _flush(self):
+        """Write every queued store in one transaction (runs on the SQLite thread)."""
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO responses (key, response, created) VALUES (?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            self.logger.error(f"Error persisting {len(rows)} cached responses: {str(e)}")
+
+    def _remember(self, key: Tuple, response: str, created: float):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    @staticmethod
+    def _db_key(key: Tuple) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def stats(self) -> Dict:
+        """Return cache counters and current size."""
+        hits = self._counters["hits"] + self._counters["disk_hits"]
+        lookups = hits + self._counters["misses"] + self._counters["deduplicated"]
+        return {
+            **self._counters,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        """Write pending stores and close the persistent tier."""
+        if self._db is not None:
+            self._db_executor.submit(self._flush)
+            self._db_executor.shutdown(wait=True)
+            self._db.close()
+            self._db = None
@@ -1,88 +1,353 @@
 import os
+import glob
+import gzip
 import json
-from typing import List, Dict, Tuple
+import hashlib
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from transformers import MBart50TokenizerFast
-from datasets import Dataset
-import pandas as pd
+from datasets import Dataset, Features, IterableDataset, Sequence, Value, load_from_disk
+
+# Columns of raw dialogues before tokenization
+RAW_FEATURES = Features({
+    'input': Value('string'),
+    'response': Value('string'),
+    'language': Value('string'),
+})
+
+# Tokenized rows are stored unpadded; padding happens in the data collator
+TOKENIZED_FEATURES = Features({
+    'input_ids': Sequence(Value('int32')),
+    'attention_mask': Sequence(Value('int8')),
+    'labels': Sequence(Value('int32')),
+    'language': Value('string'),
+})
+
+FINGERPRINT_FILE = "preprocessing_fingerprint.json"
+
+# Default file patterns per language, relative to the raw data directory.
+# ``.json`` files hold a JSON array; ``.jsonl`` shards hold one dialogue per line.
+DEFAULT_FILE_PATTERNS = (
+    "dialogues_{lang}.json",
+    "dialogues_{lang}*.jsonl",
+    "dialogues_{lang}*.jsonl.gz",
+)
+
+def iter_dialogue_file(file_path: str) -> Iterator[Dict]:
+    """Yield dialogues from a JSON array, JSONL or gzipped JSONL file.
+
+    JSONL files are read line by line, so they are never fully in memory.
+    """
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rt', encoding='utf-8') as f:
+        if '.jsonl' in os.path.basename(file_path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def _hash_fraction(*parts: str) -> float:
+    """Map strings to a deterministic value in [0, 1)."""
+    digest = hashlib.sha1("\0".join(parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def _read_dialogue_files(
+    files: List[Tuple[str, str]],
+    fingerprint: str,
+    split: Optional[str] = None,
+    eval_ratio: float = 0.0,
+    sampling_ratios: Optional[Dict[str, float]] = None,
+    seed: int = 42
+) -> Iterator[Dict]:
+    """Yield raw dialogue rows one at a time from per-language files.
+
+    ``sampling_ratios`` down- (< 1) or up-samples (> 1) a language, and
+    ``split`` keeps only the ``"train"`` or ``"eval"`` side of a split
+    holding out ``eval_ratio`` of the dialogues. Sampling is not applied to
+    the eval split, so it keeps the natural language mix and has no
+    duplicates. Both decisions hash the
+    dialogue text with ``seed``, so they are deterministic across runs and
+    shards. ``fingerprint`` is unused here; it is part of the generator
+    arguments so the datasets cache is invalidated when the inputs change.
+    """
+    sampling_ratios = sampling_ratios or {}
+    for lang, file_path in files:
+        ratio = 1.0 if split == "eval" else sampling_ratios.get(lang, 1.0)
+        for dialogue in iter_dialogue_file(file_path):
+            input_text, response = dialogue['input'], dialogue['response']
+
+            if split is not None:
+                in_eval = _hash_fraction(str(seed), "split", input_text, response) < eval_ratio
+                if in_eval != (split == "eval"):
+                    continue
+
+            copies = int(ratio)
+            if _hash_fraction(str(seed), "sample", input_text, response) < ratio - copies:
+                copies += 1
+            for _ in range(copies):
+                yield {
+                    'input': input_text,
+                    'response': response,
+                    'language': lang,
+                }
 
 class DialoguePreprocessor:
-    def __init__(self, model_name: str = "facebook/mbart-large-50-many-to-many-mmt"):
-        self.tokenizer = MBart50TokenizerFast.from_pretrained(model_name)
+    def __init__(
+        self,
+        model_name: str = "facebook/mbart-large-50-many-to-many-mmt",
+        max_length: int = 128,
+        cache_dir: Optional[str] = None,
+        tokenizer: Optional[MBart50TokenizerFast] = None
+    ):
+        self.model_name = model_name
+        self.tokenizer = tokenizer or MBart50TokenizerFast.from_pretrained(model_name)
+        self.max_length = max_length
+        self.cache_dir = cache_dir
+        self.logger = logging.getLogger(__name__)
         self.supported_languages = {
             'hi': 'hi_IN',  # Hindi
             'te': 'te_IN',  # Telugu
             # Add more languages as needed
         }
-    
+
     def load_raw_data(self, data_path: str) -> List[Dict]:
-        """Load raw dialogue data from JSON files."""
-        dialogues = []
+        """Load raw dialogue data from JSON and JSONL files."""
+        return list(self.iter_dialogues(data_path))
+
+    def iter_dialogues(
+        self,
+        data_path: str,
+        split: Optional[str] = None,
+        eval_ratio: float = 0.0,
+        sampling_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        file_patterns: Optional[Dict[str, List[str]]] = None
+    ) -> Iterator[Dict]:
+        """Stream dialogues from every language's files without loading them."""
+        files = self.input_files(data_path, file_patterns)
+        return _read_dialogue_files(files, "", split, eval_ratio, sampling_ratios, seed)
+
+    def input_files(
+        self,
+        data_path: str,
+        file_patterns: Optional[Dict[str, List[str]]] = None
+    ) -> List[Tuple[str, str]]:
+        """Return ``(language, path)`` for every dialogue file or shard present.
+
+        ``file_patterns`` maps a language to glob patterns relative to
+        ``data_path``; languages without an entry use DEFAULT_FILE_PATTERNS.
+        """
+        files = []
         for lang in self.supported_languages:
-            file_path = os.path.join(data_path, f"dialogues_{lang}.json")
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lang_dialogues = json.load(f)
-                    for dialogue in lang_dialogues:
-                        dialogue['language'] = lang
-                        dialogues.append(dialogue)
-        return dialogues
+            patterns = (file_patterns or {}).get(lang) or [
+                pattern.format(lang=lang) for pattern in DEFAULT_FILE_PATTERNS
+            ]
+            paths = set()
+            for pattern in patterns:
+                paths.update(glob.glob(os.path.join(data_path, pattern)))
+            files.extend((lang, path) for path in sorted(paths))
+        return files
+
+    def fingerprint(self, files: List[Tuple[str, str]], *settings) -> str:
+        """Hash the input files, tokenization settings and any extra settings."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [self.model_name, self.max_length, *settings], sort_keys=True
+        ).encode('utf-8'))
+        for lang, file_path in files:
+            stat = os.stat(file_path)
+            digest.update(json.dumps(
+                [lang, os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns]
+            ).encode('utf-8'))
+        return digest.hexdigest()
 
     def preprocess_dialogue(self, dialogue: Dict) -> Tuple[str, str]:
         """Preprocess a single dialogue pair."""
         input_text = dialogue['input']
         response = dialogue['response']
         lang = dialogue['language']
-        
+
         # Add language tokens
         lang_token = self.supported_languages[lang]
         input_text = f"{input_text}"
         response = f"{response}"
-        
+
         return input_text, response
 
-    def create_dataset(self, dialogues: List[Dict]) -> Dataset:
-        """Create a HuggingFace dataset from dialogues."""
-        processed_data = []
-        
-        for dialogue in dialogues:
-            input_text, response = self.preprocess_dialogue(dialogue)
-            
-            # Tokenize inputs and responses
-            inputs = self.tokenizer(
-                input_text,
-                padding='max_length',
+    def tokenize_batch(self, batch: Dict[str, List]) -> Dict[str, List]:
+        """Tokenize a batch of dialogues with one fast-tokenizer call per language.
+
+        Responses are tokenized as targets in their own language, so labels
+        start with the language code the model is forced to generate.
+        """
+        rows = list(zip(batch['input'], batch['response'], batch['language']))
+        encoded = {
+            column: [None] * len(rows)
+            for column in ('input_ids', 'attention_mask', 'labels')
+        }
+
+        for lang in set(batch['language']):
+            indices = [i for i, row in enumerate(rows) if row[2] == lang]
+            pairs = [
+                self.preprocess_dialogue({'input': rows[i][0], 'response': rows[i][1], 'language': lang})
+                for i in indices
+            ]
+            self.tokenizer.tgt_lang = self.supported_languages[lang]
+            lang_encoded = self.tokenizer(
+                [input_text for input_text, _ in pairs],
+                text_target=[response for _, response in pairs],
                 truncation=True,
-                max_length=128,
-                return_tensors='pt'
+                max_length=self.max_length
+            )
+            for column in encoded:
+                for i, values in zip(indices, lang_encoded[column]):
+                    encoded[column][i] = values
+
+        encoded['language'] = batch['language']
+        return encoded
+
+    def create_dataset(
+        self,
+        dialogues: Union[Dataset, IterableDataset, Iterable[Dict]],
+        num_proc: Optional[int] = None,
+        batch_size: int = 1000
+    ) -> Union[Dataset, IterableDataset]:
+        """Create a tokenized HuggingFace dataset from dialogues.
+
+        Rows are tokenized in batches, optionally across ``num_proc``
+        processes, and stored as unpadded Arrow integer arrays. An
+        IterableDataset is tokenized lazily as it is iterated.
+        """
+        if isinstance(dialogues, IterableDataset):
+            return dialogues.map(
+                self.tokenize_batch,
+                batched=True,
+                batch_size=batch_size,
+                remove_columns=['input', 'response'],
+                features=TOKENIZED_FEATURES
+            )
+
+        if not isinstance(dialogues, Dataset):
+            dialogues = Dataset.from_list(
+                [
+                    {'input': d['input'], 'response': d['response'], 'language': d['language']}
+                    for d in dialogues
+                ],
+                features=RAW_FEATURES
+            )
+
+        return dialogues.map(
+            self.tokenize_batch,
+            batched=True,
+            batch_size=batch_size,
+            num_proc=num_proc,
+            remove_columns=dialogues.column_names,
+            features=TOKENIZED_FEATURES,
+            desc="Tokenizing dialogues"
+        )
+
+    def stream_dataset(
+        self,
+        data_path: str,
+        split: Optional[str] = None,
+        eval_ratio: float = 0.0,
+        sampling_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        file_patterns: Optional[Dict[str, List[str]]] = None
+    ) -> IterableDataset:
+        """Return a lazily tokenized IterableDataset over the raw files.
+
+        The dataset is sharded by input file, so DataLoader workers read
+        different shards in parallel.
+        """
+        files = self.input_files(data_path, file_patterns)
+        raw_dataset = IterableDataset.from_generator(
+            _read_dialogue_files,
+            gen_kwargs={
+                'files': files,
+                'fingerprint': self.fingerprint(files),
+                'split': split,
+                'eval_ratio': eval_ratio,
+                'sampling_ratios': sampling_ratios,
+                'seed': seed,
+            },
+            features=RAW_FEATURES
+        )
+        return self.create_dataset(raw_dataset)
+
+    def stream_raw_dataset(
+        self,
+        files: List[Tuple[str, str]],
+        fingerprint: str,
+        split: Optional[str] = None,
+        eval_ratio: float = 0.0,
+        sampling_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42
+    ) -> Dataset:
+        """Stream dialogue files into an Arrow-backed dataset on disk."""
+        return Dataset.from_generator(
+            _read_dialogue_files,
+            gen_kwargs={
+                'files': files,
+                'fingerprint': fingerprint,
+                'split': split,
+                'eval_ratio': eval_ratio,
+                'sampling_ratios': sampling_ratios,
+                'seed': seed,
+            },
+            features=RAW_FEATURES,
+            cache_dir=self.cache_dir
+        )
+
+    def process_and_save(
+        self,
+        raw_data_path: str,
+        output_path: str,
+        num_proc: Optional[int] = None,
+        eval_ratio: Optional[float] = None,
+        sampling_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        file_patterns: Optional[Dict[str, List[str]]] = None
+    ) -> Union[Dataset, Dict[str, Dataset]]:
+        """Process all dialogues and save the dataset.
+
+        With ``eval_ratio``, saves ``train`` and ``eval`` splits under
+        ``output_path`` and returns both. Skipped when ``output_path``
+        already holds datasets built from the same inputs and settings.
+        """
+        files = self.input_files(raw_data_path, file_patterns)
+        fingerprint = self.fingerprint(files, eval_ratio, sampling_ratios, seed)
+        splits = ("train", "eval") if eval_ratio is not None else (None,)
+
+        def split_path(split):
+            return os.path.join(output_path, split) if split else output_path
+
+        fingerprint_path = os.path.join(output_path, FINGERPRINT_FILE)
+        if os.path.exists(fingerprint_path):
+            with open(fingerprint_path, 'r', encoding='utf-8') as f:
+                if json.load(f).get('fingerprint') == fingerprint:
+                    self.logger.info(f"Inputs unchanged, reusing {output_path}")
+                    datasets = {split: load_from_disk(split_path(split)) for split in splits}
+                    return datasets if eval_ratio is not None else datasets[None]
+
+        datasets = {}
+        for split in splits:
+            raw_dataset = self.stream_raw_dataset(
+                files, fingerprint, split, eval_ratio or 0.0, sampling_ratios, seed
             )
-            
-            with self.tokenizer.as_target_tokenizer():
-                labels = self.tokenizer(
-                    response,
-                    padding='max_length',
-                    truncation=True,
-                    max_length=128,
-                    return_tensors='pt'
-                )
-            
-            processed_data.append({
-                'input_ids': inputs['input_ids'].squeeze(),
-                'attention_mask': inputs['attention_mask'].squeeze(),
-                'labels': labels['input_ids'].squeeze(),
-                'language': dialogue['language']
-            })
-        
-        return Dataset.from_pandas(pd.DataFrame(processed_data))
-
-    def process_and_save(self, raw_data_path: str, output_path: str):
-        """Process all dialogues and save the dataset."""
-        dialogues = self.load_raw_data(raw_data_path)
-        dataset = self.create_dataset(dialogues)
-        dataset.save_to_disk(output_path)
+            datasets[split] = self.create_dataset(raw_dataset, num_proc=num_proc)
+            datasets[split].save_to_disk(split_path(split))
+        with open(fingerprint_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint}, f)
+        return datasets if eval_ratio is not None else datasets[None]
 
 if __name__ == "__main__":
     processor = DialoguePreprocessor()
     processor.process_and_save(
         raw_data_path="../../data/raw",
-        output_path="../../data/processed"
-    ) 
\ No newline at end of file
+        output_path="../../data/processed",
+        num_proc=os.cpu_count(),
+        eval_ratio=0.05
+    )
@@ -0,0 +1,131 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# Decoding strategies from cheapest to most expensive
+STRATEGIES = (
+    ("greedy", 1),
+    ("small_beam", 2),
+    ("full_beam", 5),
+)
+
+# Quality tiers a request can ask for, mapped to their preferred strategy
+QUALITY_TIERS = {
+    "fast": "greedy",
+    "balanced": "small_beam",
+    "best": "full_beam",
+}
+
+# Floor for step cost estimates, e.g. after a batch timed at zero seconds
+MIN_STEP_MS = 0.01
+
+def _beam_cost(num_beams: int) -> float:
+    """Relative cost of one decoding step at a beam width (greedy = 1)."""
+    return 1 + 0.25 * (num_beams - 1)
+
+class DecodingPolicy:
+    """Choose decoding parameters per request from latency budgets and load.
+
+    Each request starts from its quality tier (``best`` by default, which
+    matches the fixed ``num_beams=5``/``max_length=100`` decoding). The
+    policy then steps down to cheaper strategies and shorter ``max_length``
+    when the request's latency budget would be exceeded, or when the
+    batching queue grows past ``queue_soft_limit``.
+
+    Per-step decoding cost is learned online, per beam width and batch
+    size, from the batches the engine reports through ``observe``. A request
+    is costed at the batch size it will likely run in: the queue depth plus
+    one, capped at ``max_batch_size``.
+    """
+
+    def __init__(
+        self,
+        queue_depth: Optional[Callable[[], int]] = None,
+        default_max_length: int = 100,
+        min_max_length: int = 16,
+        queue_soft_limit: int = 16,
+        initial_step_ms: float = 25.0,
+        smoothing: float = 0.2,
+        max_batch_size: int = 8
+    ):
+        if queue_soft_limit < 1:
+            raise ValueError("queue_soft_limit must be at least 1")
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.default_max_length = default_max_length
+        self.min_max_length = min_max_length
+        self.queue_soft_limit = queue_soft_limit
+        self.initial_step_ms = initial_step_ms
+        self.smoothing = smoothing
+        self.max_batch_size = max_batch_size
+
+        self._lock = threading.Lock()
+        # Keyed by (num_beams, batch_size)
+        self._step_ms: Dict[Tuple[int, int], float] = {}
+
+    def observe(self, num_beams: int, steps: int, seconds: float, batch_size: int = 1):
+        """Record that a batch of ``batch_size`` decoded ``steps`` steps in ``seconds``."""
+        if steps <= 0:
+            return
+        sample = seconds * 1000.0 / steps
+        key = (num_beams, batch_size)
+        with self._lock:
+            previous = self._step_ms.get(key)
+            if previous is None:
+                self._step_ms[key] = sample
+            else:
+                self._step_ms[key] = (
+                    (1 - self.smoothing) * previous + self.smoothing * sample
+                )
+
+    def step_ms(self, num_beams: int, batch_size: int = 1) -> float:
+        """Return the estimated cost in milliseconds of one decoding step."""
+        with self._lock:
+            observed = dict(self._step_ms)
+        if observed:
+            # Nearest batch size first, then nearest width, scaled by the relative beam cost
+            nearest = min(
+                observed, key=lambda key: (abs(key[1] - batch_size), abs(key[0] - num_beams))
+            )
+            step = observed[nearest] * _beam_cost(num_beams) / _beam_cost(nearest[0])
+        else:
+            step = self.initial_step_ms * _beam_cost(num_beams)
+        # Never zero, so budgets can always be divided by it
+        return max(step, MIN_STEP_MS)
+
+    def choose(
+        self,
+        latency_budget_ms: Optional[float] = None,
+        quality: Optional[str] = None
+    ) -> Dict:
+        """Return ``num_beams`` and ``max_length`` for a request."""
+        tier = quality or "best"
+        if tier not in QUALITY_TIERS:
+            raise ValueError(f"Unsupported quality tier: {quality}")
+        names = [name for name, _ in STRATEGIES]
+        level = names.index(QUALITY_TIERS[tier])
+        max_length = self.default_max_length
+
+        # Degrade one strategy per multiple of the soft limit and shorten output
+        load = self.queue_depth() / self.queue_soft_limit
+        if load >= 1:
+            level = max(0, level - int(load))
+            max_length = max(self.min_max_length, int(max_length / load))
+
+        if latency_budget_ms is not None:
+            batch_size = min(self.queue_depth() + 1, self.max_batch_size)
+            while level > 0 and (
+                self.step_ms(STRATEGIES[level][1], batch_size) * max_length > latency_budget_ms
+            ):
+                level -= 1
+            affordable = int(latency_budget_ms / self.step_ms(STRATEGIES[level][1], batch_size))
+            max_length = max(self.min_max_length, min(max_length, affordable))
+
+        strategy, num_beams = STRATEGIES[level]
+        return {"num_beams": num_beams, "max_length": max_length, "strategy": strategy}
+
+    def stats(self) -> Dict:
+        """Return the learned per-step costs (by beam width, then batch size) and queue depth."""
+        step_ms: Dict[int, Dict[int, float]] = {}
+        with self._lock:
+            for (num_beams, batch_size), ms in sorted(self._step_ms.items()):
+                step_ms.setdefault(num_beams, {})[batch_size] = ms
+        return {"step_ms": step_ms, "queue_depth": self.queue_depth()}
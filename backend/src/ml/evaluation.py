@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from sacrebleu.metrics import BLEU, CHRF
+from transformers import MBart50TokenizerFast
+
+from ml.batch_inference import BatchRunner, read_items
+from ml.data_preprocessing import DialoguePreprocessor
+from ml.loading import checkpoint_hash
+from ml.reporting import summarize, write_results
+
+logger = logging.getLogger(__name__)
+
+def load_eval_set(
+    eval_path: str,
+    model_path: str,
+    eval_ratio: float = 0.05,
+    seed: int = 42,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """Load ``{message, reference, language}`` items to evaluate on.
+
+    ``eval_path`` is a JSON list or JSONL file of ``{input, response,
+    language}`` (or ``{message, reference, language}``) items, or a raw
+    dialogue directory, whose held-out split is used. That split hashes
+    dialogues the same way training does, so with the same ``eval_ratio``
+    and ``seed`` it holds no training data.
+    """
+    if os.path.isdir(eval_path):
+        preprocessor = DialoguePreprocessor(tokenizer=MBart50TokenizerFast.from_pretrained(model_path))
+        dialogues = preprocessor.iter_dialogues(eval_path, split="eval", eval_ratio=eval_ratio, seed=seed)
+    else:
+        dialogues = read_items(eval_path)
+
+    return [
+        {
+            "message": dialogue.get("message", dialogue.get("input")),
+            "reference": dialogue.get("reference", dialogue.get("response")),
+            "language": dialogue["language"],
+        }
+        for dialogue in itertools.islice(dialogues, limit)
+    ]
+
+def _load_chatbot(model_path: str, precision: str, workers: int, num_threads: Optional[int]):
+    if workers > 0:
+        from ml.workers import WorkerPool
+        chatbot = WorkerPool(workers, model_path, precision=precision)
+        chatbot.load()
+        return chatbot
+
+    from ml.inference import MultilingualChatbot
+    return MultilingualChatbot(model_path, device="cpu", precision=precision, num_threads=num_threads)
+
+def evaluate_checkpoint(
+    model_path: str,
+    items: List[Dict],
+    precision: str = "fp32",
+    num_beams: int = 5,
+    max_length: int = 100,
+    batch_size: int = 32,
+    max_batch_tokens: int = 8192,
+    workers: int = 0,
+    num_threads: Optional[int] = None,
+    cache_dir: Optional[str] = None
+) -> Dict:
+    """Score a checkpoint's replies and time their generation.
+
+    Items are generated in length-sorted padded batches, spread over
+    ``workers`` processes (or in this process with 0). Per language the
+    report has corpus BLEU and chrF against the references, output
+    tokens/sec and per-sample latency percentiles (a sample's latency is
+    that of its batch). chrF works on characters, so it does not depend on
+    BLEU's word tokenization of Indic scripts. With ``cache_dir`` the report
+    is cached per checkpoint hash, eval set and settings.
+    """
+    settings = {
+        "precision": precision,
+        "num_beams": num_beams,
+        "max_length": max_length,
+        "batch_size": batch_size,
+        "max_batch_tokens": max_batch_tokens,
+        "workers": workers,
+        "num_threads": num_threads,
+    }
+    checkpoint = checkpoint_hash(model_path)
+    settings_hash = hashlib.sha256(json.dumps(
+        [settings, items], sort_keys=True, ensure_ascii=False
+    ).encode('utf-8')).hexdigest()
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, checkpoint[:16], f"{settings_hash[:16]}.json")
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            logger.info(f"Using cached evaluation {cache_path}")
+            return {**report, "cached": True}
+
+    chatbot = _load_chatbot(model_path, precision, workers, num_threads)
+    try:
+        runner = BatchRunner(
+            chatbot,
+            batch_size=batch_size,
+            max_batch_tokens=max_batch_tokens,
+            concurrency=max(workers, 1),
+            max_length=max_length,
+            num_beams=num_beams
+        )
+        start = time.perf_counter()
+        results = list(runner.run(items))
+        wall_seconds = time.perf_counter() - start
+    finally:
+        if workers > 0:
+            chatbot.close()
+
+    by_language: Dict[str, List] = defaultdict(list)
+    for result in results:
+        by_language[result["language"]].append((result, items[result["index"]]["reference"]))
+
+    throughput = runner.summary()
+    languages, signatures = {}, {}
+    for language, pairs in sorted(by_language.items()):
+        generated = [(result, reference) for result, reference in pairs if "response" in result]
+        hypotheses = [result["response"] for result, _ in generated]
+        references = [reference for _, reference in generated]
+        bleu, chrf = BLEU(), CHRF()
+        languages[language] = {
+            "samples": len(pairs),
+            "errors": len(pairs) - len(generated),
+            "bleu": bleu.corpus_score(hypotheses, [references]).score if generated else None,
+            "chrf": chrf.corpus_score(hypotheses, [references]).score if generated else None,
+            "output_tokens_per_second": throughput.get(language, {}).get("output_tokens_per_second", 0.0),
+            "latency_ms": summarize([result["latency_ms"] / 1000 for result, _ in generated]),
+        }
+        if generated:
+            signatures = {"bleu": str(bleu.get_signature()), "chrf": str(chrf.get_signature())}
+
+    output_tokens = sum(stats["output_tokens"] for stats in throughput.values())
+    report = {
+        "model_path": model_path,
+        "checkpoint": checkpoint,
+        "settings": settings,
+        "metrics": signatures,
+        "samples": len(results),
+        "wall_seconds": wall_seconds,
+        "output_tokens_per_second": output_tokens / wall_seconds if wall_seconds else 0.0,
+        "languages": languages,
+    }
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return {**report, "cached": False}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score checkpoints with BLEU/chrF next to throughput and latency."
+    )
+    parser.add_argument("--model-path", nargs="+", default=["../../models/pretrained/finetuned_mbart"],
+                        help="One or more model directories to compare")
+    parser.add_argument("--eval-path", default="../../data/raw",
+                        help="Raw dialogue directory (held-out split) or a JSON/JSONL eval file")
+    parser.add_argument("--eval-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=None, help="Evaluate at most this many items")
+    parser.add_argument("--precision", nargs="+", default=["fp32"])
+    parser.add_argument("--beams", type=int, nargs="+", default=[5])
+    parser.add_argument("--max-length", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-batch-tokens", type=int, default=8192)
+    parser.add_argument("--workers", type=int, default=0, help="Generate in this many worker processes")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--cache-dir", default="../../models/eval_cache")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    runs = []
+    for model_path in args.model_path:
+        items = load_eval_set(args.eval_path, model_path, args.eval_ratio, args.seed, args.limit)
+        for precision, num_beams in itertools.product(args.precision, args.beams):
+            runs.append(evaluate_checkpoint(
+                model_path,
+                items,
+                precision=precision,
+                num_beams=num_beams,
+                max_length=args.max_length,
+                batch_size=args.batch_size,
+                max_batch_tokens=args.max_batch_tokens,
+                workers=args.workers,
+                num_threads=args.threads,
+                cache_dir=None if args.no_cache else args.cache_dir
+            ))
+    write_results("evaluation", {"runs": runs}, args.output)
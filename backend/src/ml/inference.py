@@ -1,14 +1,75 @@
-from transformers import MBartForConditionalGeneration, MBart50TokenizerFast
+from transformers import (
+    BatchEncoding,
+    MBart50TokenizerFast,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer
+)
 import torch
-from typing import Optional
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import logging
 from utils import setup_logging
+from metrics import (
+    MODEL_MEMORY_BYTES,
+    OUTPUT_TOKENS,
+    OUTPUT_TOKENS_PER_SECOND,
+    STAGE_SECONDS
+)
+from ml.loading import load_model
+from ml.optimization import apply_precision, configure_threads
+from ml.vocab_pruning import VocabMap
+
+# Served languages mapped to their mBART-50 language codes
+LANGUAGE_CODES = {
+    'hi': 'hi_IN',  # Hindi
+    'te': 'te_IN',  # Telugu
+    # Add more languages as needed
+}
+
+class _StopOnEvent(StoppingCriteria):
+    """Stop generation once an event is set, e.g. when a client disconnects."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+class _RemappedStreamer(TextIteratorStreamer):
+    """Text streamer for pruned models, mapping ids back before decoding."""
+
+    def __init__(self, tokenizer, vocab_map: VocabMap, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.vocab_map = vocab_map
+
+    def put(self, value):
+        super().put(self.vocab_map.to_tokenizer(value))
+
+def state_dict_bytes(values) -> int:
+    """Sum tensor storage, including tensors packed in tuples (int8 layers)."""
+    total = 0
+    for value in values:
+        if isinstance(value, torch.Tensor):
+            total += value.numel() * value.element_size()
+        elif isinstance(value, (tuple, list)):
+            total += state_dict_bytes(value)
+    return total
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when generation is requested before the model has loaded."""
 
 class MultilingualChatbot:
     def __init__(
         self,
         model_path: str = "../../models/pretrained/finetuned_mbart",
-        device: Optional[str] = None
+        device: Optional[str] = None,
+        precision: str = "fp32",
+        num_threads: Optional[int] = None,
+        num_interop_threads: Optional[int] = None,
+        use_mmap: bool = True,
+        lazy: bool = False
     ):
         # Setup logging
         setup_logging()
@@ -18,16 +79,66 @@ class MultilingualChatbot:
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.logger.info(f"Using device: {self.device}")
         
-        # Load model and tokenizer
-        self.model = MBartForConditionalGeneration.from_pretrained(model_path).to(self.device)
-        self.tokenizer = MBart50TokenizerFast.from_pretrained(model_path)
+        # Configure torch threading before any inference work starts
+        configure_threads(num_threads, num_interop_threads)
+
+        self.model_path = model_path
+        self.precision = precision
+        self.use_mmap = use_mmap
+        self.model = None
+        self.model_bytes = 0
+        self.tokenizer = None
+        self.vocab_map = None
+        self._ready = threading.Event()
         
         # Language mapping
-        self.language_codes = {
-            'hi': 'hi_IN',  # Hindi
-            'te': 'te_IN',  # Telugu
-            # Add more languages as needed
-        }
+        self.language_codes = dict(LANGUAGE_CODES)
+
+        # With ``lazy`` the caller loads the model later, e.g. in the background
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """Load the model and tokenizer."""
+        # Safetensors weights are memory-mapped and paged in on first use
+        self.model = load_model(self.model_path, use_mmap=self.use_mmap).to(self.device)
+        self.tokenizer = MBart50TokenizerFast.from_pretrained(self.model_path)
+
+        # Pruned models ship an id map between the tokenizer and model vocabularies
+        self.vocab_map = VocabMap.load(self.model_path)
+        if self.vocab_map is not None:
+            self.vocab_map.to(self.device)
+            self.logger.info(f"Using pruned vocabulary of {len(self.vocab_map)} tokens")
+
+        # Convert to the requested inference precision (fp32, int8 or bf16)
+        self.model = apply_precision(self.model, self.precision, self.device)
+        self.logger.info(f"Using precision: {self.precision}")
+        self.model_bytes = state_dict_bytes(self.model.state_dict().values())
+        MODEL_MEMORY_BYTES.set(self.model_bytes)
+        self._ready.set()
+
+    def is_ready(self) -> bool:
+        """Return whether the model is loaded."""
+        return self._ready.is_set()
+
+    def require_ready(self):
+        """Raise ModelNotReadyError until the model is loaded."""
+        if not self._ready.is_set():
+            raise ModelNotReadyError("Model is still loading")
+
+    def warmup(self, prompts: Dict[str, List[str]], beam_sizes: List[int] = (1, 5)):
+        """Run representative prompts through every language and beam size.
+
+        This pages in the weights and lets torch allocate its buffers before
+        the first real request.
+        """
+        for language, texts in prompts.items():
+            if language not in self.language_codes:
+                continue
+            for num_beams in beam_sizes:
+                self.generate_batch(texts, language, num_beams=num_beams)
+                self.generate_batch(texts[:1], language, num_beams=num_beams)
+        self.logger.info(f"Warmed up {len(prompts)} languages")
 
     def generate_response(
         self,
@@ -39,38 +150,198 @@ class MultilingualChatbot:
     ) -> str:
         """Generate a response for the given input text in the specified language."""
         try:
-            # Set the language token
-            lang_code = self.language_codes.get(language)
-            if not lang_code:
-                raise ValueError(f"Unsupported language: {language}")
+            return self.generate_batch(
+                [input_text],
+                language,
+                max_length=max_length,
+                num_beams=num_beams,
+                temperature=temperature
+            )[0]
 
-            # Tokenize input
-            inputs = self.tokenizer(
-                input_text,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=512
-            ).to(self.device)
+        except Exception as e:
+            self.logger.error(f"Error generating response: {str(e)}")
+            return f"Error: {str(e)}"
+
+    def generate_batch(
+        self,
+        input_texts: List[Union[str, List[int]]],
+        language: str,
+        max_length: int = 100,
+        num_beams: int = 5,
+        temperature: float = 0.7,
+        deadline: Optional[float] = None,
+        return_token_counts: bool = False
+    ) -> Union[List[str], Tuple[List[str], List[int]]]:
+        """Generate responses for a batch of inputs sharing one target language.
+
+        Inputs are padded to the longest one and decoded with a single
+        ``model.generate`` call. An input may also be a list of token ids,
+        e.g. a session's context. Decoding stops early at ``deadline`` (a
+        ``time.monotonic()`` timestamp). With ``return_token_counts``, also
+        returns each response's generated token count, special tokens
+        included. Errors are raised, not returned.
+        """
+        self.require_ready()
+
+        # Set the language token
+        lang_code = self.language_codes.get(language)
+        if not lang_code:
+            raise ValueError(f"Unsupported language: {language}")
+
+        # Tokenize inputs
+        start = time.perf_counter()
+        inputs = self._encode(input_texts)
+        tokenized = time.perf_counter()
+
+        # Generate responses
+        max_time = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+        outputs = self._generate(inputs, lang_code, max_length, num_beams, temperature, max_time)
+        generated = time.perf_counter()
+
+        # Decode responses
+        if self.vocab_map is not None:
+            outputs = self.vocab_map.to_tokenizer(outputs)
+        responses = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        decoded = time.perf_counter()
+
+        token_counts = (outputs != self.tokenizer.pad_token_id).sum(1).tolist()
+        num_tokens = sum(token_counts)
+        STAGE_SECONDS.observe(tokenized - start, stage="tokenize", language=language)
+        STAGE_SECONDS.observe(generated - tokenized, stage="generate", language=language)
+        STAGE_SECONDS.observe(decoded - generated, stage="decode", language=language)
+        OUTPUT_TOKENS.inc(num_tokens, language=language)
+        OUTPUT_TOKENS_PER_SECOND.observe(num_tokens / max(generated - tokenized, 1e-9), language=language)
+        if return_token_counts:
+            return responses, token_counts
+        return responses
 
-            # Generate response
-            outputs = self.model.generate(
+    def _generate(
+        self,
+        inputs,
+        lang_code: str,
+        max_length: int,
+        num_beams: int,
+        temperature: float,
+        max_time: Optional[float] = None
+    ) -> torch.Tensor:
+        """Decode encoded inputs, for at most ``max_time`` seconds; returns padded model token ids."""
+        with torch.no_grad():
+            return self.model.generate(
                 **inputs,
                 max_length=max_length,
                 num_beams=num_beams,
                 temperature=temperature,
-                forced_bos_token_id=self.tokenizer.lang_code_to_id[lang_code],
+                max_time=max_time,
+                forced_bos_token_id=self._forced_bos_token_id(lang_code),
                 no_repeat_ngram_size=2,
                 early_stopping=True
             )
 
-            # Decode response
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            return response
+    def _encode(self, input_texts):
+        """Tokenize inputs, mapping ids into a pruned vocabulary if needed."""
+        if not all(isinstance(text, str) for text in input_texts):
+            # Session contexts arrive as token ids and may share a batch with text
+            inputs = self._pad([
+                self.tokenizer(text, truncation=True, max_length=512)["input_ids"]
+                if isinstance(text, str) else text
+                for text in input_texts
+            ])
+        else:
+            inputs = self.tokenizer(
+                input_texts,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=512
+            ).to(self.device)
+        if self.vocab_map is not None:
+            inputs["input_ids"] = self.vocab_map.to_model(inputs["input_ids"])
+        return inputs
 
-        except Exception as e:
-            self.logger.error(f"Error generating response: {str(e)}")
-            return f"Error: {str(e)}"
+    def _pad(self, input_ids: List[List[int]]):
+        """Right-pad already tokenized inputs into a batch."""
+        longest = max(len(ids) for ids in input_ids)
+        ids = torch.full((len(input_ids), longest), self.tokenizer.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(input_ids), longest), dtype=torch.long)
+        for row, values in enumerate(input_ids):
+            ids[row, :len(values)] = torch.tensor(values, dtype=torch.long)
+            mask[row, :len(values)] = 1
+        return BatchEncoding({"input_ids": ids, "attention_mask": mask}).to(self.device)
+
+    def _forced_bos_token_id(self, lang_code: str) -> int:
+        token_id = self.tokenizer.lang_code_to_id[lang_code]
+        if self.vocab_map is not None:
+            token_id = self.vocab_map.to_model(token_id)
+        return token_id
+
+    def stream_response(
+        self,
+        input_text: Union[str, List[int]],
+        language: str,
+        max_length: int = 100,
+        temperature: float = 0.7,
+        stop_event: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """Stream a response as decoded text chunks while it is generated.
+
+        Generation runs greedily (streaming does not support beam search) in a
+        background thread and stops early once ``stop_event`` is set or the
+        returned iterator is closed.
+        """
+        self.require_ready()
+        lang_code = self.language_codes.get(language)
+        if not lang_code:
+            raise ValueError(f"Unsupported language: {language}")
+
+        inputs = self._encode([input_text])
+
+        stop_event = stop_event or threading.Event()
+        if self.vocab_map is not None:
+            streamer = _RemappedStreamer(
+                self.tokenizer,
+                self.vocab_map,
+                skip_prompt=True,
+                skip_special_tokens=True
+            )
+        else:
+            streamer = TextIteratorStreamer(
+                self.tokenizer,
+                skip_prompt=True,
+                skip_special_tokens=True
+            )
+        errors = []
+
+        def run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(
+                        **inputs,
+                        max_length=max_length,
+                        num_beams=1,
+                        temperature=temperature,
+                        forced_bos_token_id=self._forced_bos_token_id(lang_code),
+                        no_repeat_ngram_size=2,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop_event)])
+                    )
+            except Exception as e:
+                self.logger.error(f"Error streaming response: {str(e)}")
+                errors.append(e)
+                streamer.end()
+
+        threading.Thread(target=run, daemon=True).start()
+
+        def chunks():
+            try:
+                for text in streamer:
+                    if text:
+                        yield text
+                if errors:
+                    raise errors[0]
+            finally:
+                stop_event.set()
+
+        return chunks()
 
     def get_supported_languages(self) -> list:
         """Return list of supported languages."""
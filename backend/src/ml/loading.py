@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+import torch
+from transformers import GenerationConfig, MBartConfig, MBartForConditionalGeneration
+
+from metrics import STARTUP_SECONDS
+
+SAFETENSORS_FILE = "model.safetensors"
+SAFETENSORS_INDEX_FILE = "model.safetensors.index.json"
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+def checkpoint_hash(model_path: str) -> str:
+    """Hash a model directory's files by name, size and modification time."""
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(model_path)):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            digest.update(json.dumps(
+                [os.path.relpath(path, model_path), stat.st_size, stat.st_mtime_ns]
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+def safetensors_files(model_path: str) -> List[str]:
+    """Return the model's safetensors file(s), or an empty list if it has none."""
+    index_path = os.path.join(model_path, SAFETENSORS_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+        return [os.path.join(model_path, shard) for shard in shards]
+    path = os.path.join(model_path, SAFETENSORS_FILE)
+    return [path] if os.path.exists(path) else []
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """Map a safetensors file into memory and return zero-copy tensors over it.
+
+    The file is mapped copy-on-write, so pages are read lazily on first
+    access and stay shared through the page cache between every process
+    that maps the same file, until one of them writes to a tensor.
+    """
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+        if count == 0:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensors[name] = torch.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + begin
+        ).view(info["shape"])
+    return tensors
+
+def load_model(model_path: str, use_mmap: bool = True) -> MBartForConditionalGeneration:
+    """Load an mBART model, memory-mapping safetensors weights when possible.
+
+    The model is built on the meta device and its parameters are pointed at
+    the mapped weights, so loading does no copy and allocates no weight
+    memory up front. Checkpoints without safetensors, or whose weights are
+    not float32, go through ``from_pretrained`` as before.
+    """
+    logger = logging.getLogger(__name__)
+    files = safetensors_files(model_path) if use_mmap else []
+    if not files:
+        return MBartForConditionalGeneration.from_pretrained(model_path)
+
+    state_dict: Dict[str, torch.Tensor] = {}
+    for path in files:
+        state_dict.update(mmap_safetensors(path))
+    if any(tensor.dtype != torch.float32 for tensor in state_dict.values()):
+        logger.info("Checkpoint is not float32, loading without mmap")
+        return MBartForConditionalGeneration.from_pretrained(model_path)
+
+    config = MBartConfig.from_pretrained(model_path)
+    with torch.device("meta"):
+        model = MBartForConditionalGeneration(config)
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    # Tied embeddings are saved once; point the other copies at the mapped one
+    model.tie_weights()
+
+    missing = [
+        name for name, tensor in list(model.named_parameters()) + list(model.named_buffers())
+        if tensor.is_meta
+    ]
+    if missing:
+        logger.info(f"Weights missing from safetensors ({missing[:3]}), loading without mmap")
+        return MBartForConditionalGeneration.from_pretrained(model_path)
+
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(model_path)
+    except OSError:
+        model.generation_config = GenerationConfig.from_model_config(config)
+    model.eval()
+    return model
+
+class BackgroundLoader:
+    """Load and warm up a lazily constructed MultilingualChatbot off the event loop.
+
+    ``status()`` reports ``loading``, ``ready`` or ``failed`` along with the
+    load, warmup and total time to ready, measured from ``started_at``
+    (usually when the server module was imported).
+    """
+
+    def __init__(
+        self,
+        chatbot,
+        warmup_prompts: Optional[Dict[str, List[str]]] = None,
+        warmup_beam_sizes: List[int] = (1, 5),
+        started_at: Optional[float] = None
+    ):
+        self.chatbot = chatbot
+        self.warmup_prompts = warmup_prompts
+        self.warmup_beam_sizes = list(warmup_beam_sizes)
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.logger = logging.getLogger(__name__)
+
+        self.state = "loading"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start loading in a daemon thread (no-op if already started)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            self.chatbot.load()
+            loaded = time.perf_counter()
+            self.timings["load_seconds"] = loaded - start
+
+            if self.warmup_prompts:
+                self.chatbot.warmup(self.warmup_prompts, self.warmup_beam_sizes)
+            self.timings["warmup_seconds"] = time.perf_counter() - loaded
+            self.timings["ready_seconds"] = time.perf_counter() - self.started_at
+            self.state = "ready"
+
+            for phase in ("load", "warmup", "ready"):
+                STARTUP_SECONDS.set(self.timings[f"{phase}_seconds"], phase=phase)
+            self.logger.info(
+                f"Model ready in {self.timings['ready_seconds']:.2f}s "
+                f"(load {self.timings['load_seconds']:.2f}s, "
+                f"warmup {self.timings['warmup_seconds']:.2f}s)"
+            )
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            self.logger.error(f"Error loading model: {str(e)}")
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict:
+        status = {"status": self.state, **self.timings}
+        if self.error:
+            status["error"] = self.error
+        return status
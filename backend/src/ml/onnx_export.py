@@ -0,0 +1,252 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+import torch
+from transformers import MBart50TokenizerFast
+
+from ml.loading import load_model
+from ml.onnx_inference import onnx_files
+from ml.optimization import VALIDATION_PROMPTS, time_responses
+from ml.vocab_pruning import VOCAB_MAP_FILE
+
+OPSET = 14
+
+logger = logging.getLogger(__name__)
+
+class _EncoderWithCrossAttention(torch.nn.Module):
+    """Encoder that also projects every decoder layer's cross-attention keys and values.
+
+    They depend only on the encoder output, so computing them once here
+    keeps the projections out of the per-token decoder graph.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+        self.layers = model.get_decoder().layers
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask)[0]
+        batch = hidden.shape[0]
+        outputs = []
+        for layer in self.layers:
+            attention = layer.encoder_attn
+            outputs.append(attention._shape(attention.k_proj(hidden), -1, batch))
+            outputs.append(attention._shape(attention.v_proj(hidden), -1, batch))
+        return tuple(outputs)
+
+class _DecoderWithPast(torch.nn.Module):
+    """One decoder step from the newest token and the cached keys and values."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.decoder = model.get_decoder()
+        self.lm_head = model.lm_head
+        self.register_buffer("final_logits_bias", model.final_logits_bias)
+
+    def forward(self, input_ids, encoder_attention_mask, *past):
+        past_key_values = tuple(tuple(past[i:i + 4]) for i in range(0, len(past), 4))
+        batch, encoder_length = encoder_attention_mask.shape
+        # Only its length is read: the cross-attention keys and values come from the cache
+        encoder_hidden_states = past[2].new_zeros(batch, encoder_length, 1)
+        outputs = self.decoder(
+            input_ids=input_ids,
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_attention_mask,
+            past_key_values=past_key_values,
+            use_cache=True,
+            return_dict=True
+        )
+        logits = self.lm_head(outputs.last_hidden_state[:, -1, :]) + self.final_logits_bias
+        present = []
+        for layer in outputs.past_key_values:
+            present.extend(layer[:2])
+        return (logits, *present)
+
+def export_onnx(model_path: str, output_path: str, int8: bool = False) -> Dict[str, str]:
+    """Export a model directory as encoder and decoder-with-past ONNX graphs.
+
+    The tokenizer, generation config and any pruned-vocabulary map are
+    copied alongside, so ``output_path`` loads as an OnnxChatbot model.
+    With ``int8`` dynamically quantized copies of both graphs are written
+    too. Returns the written graph paths.
+    """
+    model = load_model(model_path, use_mmap=False).eval()
+    config = model.config
+    num_layers = config.decoder_layers
+    heads = config.decoder_attention_heads
+    head_dim = config.d_model // heads
+    os.makedirs(output_path, exist_ok=True)
+    encoder_path, decoder_path = onnx_files(output_path)
+
+    # Dummy inputs; every length is a dynamic axis in the exported graphs
+    batch, encoder_length, past_length = 2, 5, 3
+    input_ids = torch.full((batch, encoder_length), config.pad_token_id + 1, dtype=torch.long)
+    attention_mask = torch.ones((batch, encoder_length), dtype=torch.long)
+    cross_names = []
+    for layer in range(num_layers):
+        cross_names += [f"present.{layer}.encoder.key", f"present.{layer}.encoder.value"]
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _EncoderWithCrossAttention(model),
+            (input_ids, attention_mask),
+            encoder_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=cross_names,
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "encoder_sequence"},
+                "attention_mask": {0: "batch", 1: "encoder_sequence"},
+                **{name: {0: "batch", 2: "encoder_sequence"} for name in cross_names},
+            },
+            opset_version=OPSET
+        )
+
+        past, past_names, present_names = [], [], []
+        dynamic_axes = {
+            "input_ids": {0: "batch"},
+            "encoder_attention_mask": {0: "batch", 1: "encoder_sequence"},
+            "logits": {0: "batch"},
+        }
+        for layer in range(num_layers):
+            for kind, length, axis in (
+                ("decoder", past_length, "past_sequence"),
+                ("encoder", encoder_length, "encoder_sequence"),
+            ):
+                for name in ("key", "value"):
+                    past.append(torch.randn(batch, heads, length, head_dim))
+                    past_names.append(f"past_key_values.{layer}.{kind}.{name}")
+                    dynamic_axes[past_names[-1]] = {0: "batch", 2: axis}
+            for name in ("key", "value"):
+                present_names.append(f"present.{layer}.decoder.{name}")
+                dynamic_axes[present_names[-1]] = {0: "batch", 2: "total_sequence"}
+
+        torch.onnx.export(
+            _DecoderWithPast(model),
+            (input_ids[:, :1], attention_mask, *past),
+            decoder_path,
+            input_names=["input_ids", "encoder_attention_mask", *past_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET
+        )
+
+    MBart50TokenizerFast.from_pretrained(model_path).save_pretrained(output_path)
+    config.save_pretrained(output_path)
+    model.generation_config.save_pretrained(output_path)
+    if os.path.exists(os.path.join(model_path, VOCAB_MAP_FILE)):
+        shutil.copy(os.path.join(model_path, VOCAB_MAP_FILE), output_path)
+
+    written = {"encoder": encoder_path, "decoder": decoder_path}
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        encoder_int8, decoder_int8 = onnx_files(output_path, "int8")
+        quantize_dynamic(encoder_path, encoder_int8, weight_type=QuantType.QInt8)
+        quantize_dynamic(decoder_path, decoder_int8, weight_type=QuantType.QInt8)
+        written.update({"encoder_int8": encoder_int8, "decoder_int8": decoder_int8})
+    logger.info(f"Exported ONNX model to {output_path}")
+    return written
+
+def check_parity(
+    model_path: str,
+    onnx_path: str,
+    precision: str = "fp32",
+    prompts: Optional[Dict[str, List[str]]] = None,
+    beam_sizes: List[int] = (1, 5),
+    num_threads: Optional[int] = None
+) -> Dict:
+    """Compare the ONNX backend against the PyTorch model on a fixed prompt set.
+
+    Reports output agreement, latency and graph size per beam size, like
+    ``ml.optimization.validate_precision``.
+    """
+    from ml.inference import MultilingualChatbot
+    from ml.onnx_inference import OnnxChatbot
+
+    prompts = prompts or VALIDATION_PROMPTS
+    reference_bot = MultilingualChatbot(model_path, device="cpu", num_threads=num_threads)
+    onnx_bot = OnnxChatbot(onnx_path, device="cpu", precision=precision, num_threads=num_threads)
+    prompts = {
+        lang: texts for lang, texts in prompts.items()
+        if lang in reference_bot.get_supported_languages()
+    }
+
+    runs = []
+    for num_beams in beam_sizes:
+        reference = time_responses(reference_bot, prompts, num_beams=num_beams)
+        result = time_responses(onnx_bot, prompts, num_beams=num_beams)
+
+        comparisons, exact = [], 0
+        for language, texts in prompts.items():
+            for text, expected, actual in zip(
+                texts, reference["outputs"][language], result["outputs"][language]
+            ):
+                exact += expected == actual
+                comparisons.append({
+                    "language": language,
+                    "input": text,
+                    "torch": expected,
+                    "onnx": actual,
+                    "exact_match": expected == actual,
+                    "similarity": SequenceMatcher(None, expected, actual).ratio(),
+                })
+        runs.append({
+            "num_beams": num_beams,
+            "num_prompts": len(comparisons),
+            "exact_match_rate": exact / len(comparisons) if comparisons else 0.0,
+            "mean_similarity": (
+                sum(c["similarity"] for c in comparisons) / len(comparisons)
+                if comparisons else 0.0
+            ),
+            "latency": {
+                "torch": {k: v for k, v in reference.items() if k != "outputs"},
+                "onnx": {k: v for k, v in result.items() if k != "outputs"},
+                "speedup": reference["latency_mean_s"] / result["latency_mean_s"],
+            },
+            "comparisons": comparisons,
+        })
+
+    return {
+        "precision": precision,
+        "threads": torch.get_num_threads(),
+        "weight_bytes": {
+            "torch": reference_bot.model_bytes,
+            "onnx": onnx_bot.model_bytes,
+            "ratio": reference_bot.model_bytes / onnx_bot.model_bytes,
+        },
+        "runs": runs,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a model to ONNX and check it against the PyTorch model."
+    )
+    parser.add_argument("--model-path", default="../../models/pretrained/finetuned_mbart")
+    parser.add_argument("--output-path", default="../../models/onnx/finetuned_mbart")
+    parser.add_argument("--int8", action="store_true", help="Also write dynamically quantized int8 graphs")
+    parser.add_argument("--skip-export", action="store_true", help="Only check an existing export")
+    parser.add_argument("--skip-check", action="store_true", help="Do not run the parity check")
+    parser.add_argument("--beams", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON parity report to this file")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export_onnx(args.model_path, args.output_path, int8=args.int8)
+    if not args.skip_check:
+        reports = [
+            check_parity(args.model_path, args.output_path, precision, beam_sizes=args.beams,
+                         num_threads=args.threads)
+            for precision in (("fp32", "int8") if args.int8 else ("fp32",))
+        ]
+        text = json.dumps(reports, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+        print(text)
@@ -0,0 +1,309 @@
+import glob
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from transformers import GenerationConfig, MBart50TokenizerFast
+
+from metrics import MODEL_MEMORY_BYTES
+from ml.inference import MultilingualChatbot
+from ml.vocab_pruning import VocabMap
+
+ENCODER_FILE = "encoder_model{suffix}.onnx"
+DECODER_FILE = "decoder_with_past_model{suffix}.onnx"
+
+def onnx_files(model_path: str, precision: str = "fp32") -> Tuple[str, str]:
+    """Return the encoder and decoder-with-past graph paths for a precision."""
+    if precision not in ("fp32", "int8"):
+        raise ValueError(f"Unsupported ONNX precision: {precision}")
+    suffix = "_int8" if precision == "int8" else ""
+    return (
+        os.path.join(model_path, ENCODER_FILE.format(suffix=suffix)),
+        os.path.join(model_path, DECODER_FILE.format(suffix=suffix)),
+    )
+
+def _log_softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=-1, keepdims=True))
+
+def _ban_repeated_ngrams(scores: np.ndarray, sequences: np.ndarray, ngram_size: int):
+    """Ban tokens that would repeat an n-gram already in each sequence (in place)."""
+    cur_len = sequences.shape[1]
+    if cur_len + 1 < ngram_size:
+        return
+    for row, tokens in enumerate(sequences.tolist()):
+        prefix = tokens[cur_len - ngram_size + 1:]
+        banned = [
+            tokens[i + ngram_size - 1] for i in range(cur_len - ngram_size + 1)
+            if tokens[i:i + ngram_size - 1] == prefix
+        ]
+        scores[row, banned] = -np.inf
+
+class OnnxChatbot(MultilingualChatbot):
+    """MultilingualChatbot running exported ONNX graphs on ONNX Runtime (CPU).
+
+    Loads the encoder and decoder-with-past graphs written by
+    ``ml.onnx_export``. The encoder also computes every decoder layer's
+    cross-attention keys and values once per input; each decoding step then
+    feeds only the newest token plus the cached keys and values. Greedy and
+    beam search apply the same constraints as the PyTorch path (forced
+    language token, forced EOS at ``max_length``, no repeated bigrams, early
+    stopping), so the two produce the same replies up to float rounding.
+    ``precision`` is ``fp32`` or ``int8`` (dynamically quantized graphs).
+    """
+
+    def load(self):
+        """Create the ONNX Runtime sessions and load the tokenizer."""
+        import onnxruntime
+
+        encoder_path, decoder_path = onnx_files(self.model_path, self.precision)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if torch.get_num_threads():
+            options.intra_op_num_threads = torch.get_num_threads()
+        providers = ["CPUExecutionProvider"]
+        self.encoder = onnxruntime.InferenceSession(encoder_path, options, providers=providers)
+        self.decoder = onnxruntime.InferenceSession(decoder_path, options, providers=providers)
+        self.num_layers = len(self.encoder.get_outputs()) // 2
+
+        self.tokenizer = MBart50TokenizerFast.from_pretrained(self.model_path)
+        self.generation_config = GenerationConfig.from_pretrained(self.model_path)
+        self.vocab_map = VocabMap.load(self.model_path)
+        if self.vocab_map is not None:
+            self.logger.info(f"Using pruned vocabulary of {len(self.vocab_map)} tokens")
+
+        # Weights live in the graph files, plus any external data saved next to them
+        self.model_bytes = sum(
+            os.path.getsize(path)
+            for graph in (encoder_path, decoder_path)
+            for path in glob.glob(graph + "*")
+        )
+        MODEL_MEMORY_BYTES.set(self.model_bytes)
+        self.logger.info(f"Using ONNX Runtime ({self.precision})")
+        self._ready.set()
+
+    def _run_encoder(self, inputs) -> Tuple[np.ndarray, List[np.ndarray]]:
+        attention_mask = inputs["attention_mask"].cpu().numpy().astype(np.int64)
+        cross = self.encoder.run(None, {
+            "input_ids": inputs["input_ids"].cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask,
+        })
+        return attention_mask, cross
+
+    def _empty_past(self, cross: List[np.ndarray]) -> List[np.ndarray]:
+        batch, heads, _, head_dim = cross[0].shape
+        return [np.zeros((batch, heads, 0, head_dim), dtype=cross[0].dtype)] * (2 * self.num_layers)
+
+    def _decode_step(
+        self,
+        input_ids: np.ndarray,
+        attention_mask: np.ndarray,
+        cross: List[np.ndarray],
+        past: List[np.ndarray]
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """Run one decoder step; returns next-token logits and the grown self-attention cache."""
+        feed = {"input_ids": input_ids, "encoder_attention_mask": attention_mask}
+        for layer in range(self.num_layers):
+            feed[f"past_key_values.{layer}.decoder.key"] = past[2 * layer]
+            feed[f"past_key_values.{layer}.decoder.value"] = past[2 * layer + 1]
+            feed[f"past_key_values.{layer}.encoder.key"] = cross[2 * layer]
+            feed[f"past_key_values.{layer}.encoder.value"] = cross[2 * layer + 1]
+        outputs = self.decoder.run(None, feed)
+        return outputs[0], outputs[1:]
+
+    def _process(
+        self,
+        scores: np.ndarray,
+        sequences: np.ndarray,
+        forced_bos: int,
+        max_length: int
+    ) -> np.ndarray:
+        """Apply the logits processors used by the PyTorch path."""
+        cur_len = sequences.shape[1]
+        _ban_repeated_ngrams(scores, sequences, 2)
+        forced = None
+        if cur_len == 1:
+            forced = forced_bos
+        elif cur_len == max_length - 1 and self.generation_config.forced_eos_token_id is not None:
+            forced = self.generation_config.forced_eos_token_id
+        if forced is not None:
+            scores[:] = -np.inf
+            scores[:, forced] = 0
+        return scores
+
+    def _generate(
+        self,
+        inputs,
+        lang_code: str,
+        max_length: int,
+        num_beams: int,
+        temperature: float,
+        max_time: Optional[float] = None
+    ) -> torch.Tensor:
+        stop_at = time.monotonic() + max_time if max_time is not None else None
+        attention_mask, cross = self._run_encoder(inputs)
+        forced_bos = self._forced_bos_token_id(lang_code)
+        if num_beams > 1:
+            sequences = self._beam_search(attention_mask, cross, forced_bos, max_length, num_beams, stop_at)
+        else:
+            sequences = list(self._greedy(attention_mask, cross, forced_bos, max_length, stop_at))[-1]
+
+        # Pad to one tensor, as ``model.generate`` returns
+        longest = max(len(tokens) for tokens in sequences)
+        outputs = torch.full((len(sequences), longest), self.generation_config.pad_token_id, dtype=torch.long)
+        for row, tokens in enumerate(sequences):
+            outputs[row, :len(tokens)] = torch.as_tensor(tokens, dtype=torch.long)
+        return outputs
+
+    def _greedy(
+        self,
+        attention_mask: np.ndarray,
+        cross: List[np.ndarray],
+        forced_bos: int,
+        max_length: int,
+        stop_at: Optional[float] = None
+    ) -> Iterator[np.ndarray]:
+        """Greedy decoding; yields the sequences after every step until done or ``stop_at``."""
+        config = self.generation_config
+        batch = attention_mask.shape[0]
+        sequences = np.full((batch, 1), config.decoder_start_token_id, dtype=np.int64)
+        unfinished = np.ones(batch, dtype=bool)
+        past = self._empty_past(cross)
+        while True:
+            logits, past = self._decode_step(sequences[:, -1:], attention_mask, cross, past)
+            scores = self._process(logits, sequences, forced_bos, max_length)
+            next_tokens = np.where(unfinished, scores.argmax(axis=-1), config.pad_token_id)
+            sequences = np.concatenate([sequences, next_tokens[:, None]], axis=1)
+            unfinished &= next_tokens != config.eos_token_id
+            yield sequences
+            if not unfinished.any() or sequences.shape[1] >= max_length:
+                return
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return
+
+    def _beam_search(
+        self,
+        attention_mask: np.ndarray,
+        cross: List[np.ndarray],
+        forced_bos: int,
+        max_length: int,
+        num_beams: int,
+        stop_at: Optional[float] = None
+    ) -> List[np.ndarray]:
+        """Beam search with early stopping, reordering the cache between steps.
+
+        Past ``stop_at`` the best beams so far are returned.
+        """
+        config = self.generation_config
+        eos, pad = config.eos_token_id, config.pad_token_id
+        length_penalty = config.length_penalty
+        batch = attention_mask.shape[0]
+
+        attention_mask = np.repeat(attention_mask, num_beams, axis=0)
+        cross = [np.repeat(tensor, num_beams, axis=0) for tensor in cross]
+        past = self._empty_past(cross)
+        sequences = np.full((batch * num_beams, 1), config.decoder_start_token_id, dtype=np.int64)
+        beam_scores = np.zeros((batch, num_beams), dtype=np.float32)
+        beam_scores[:, 1:] = -1e9
+        beam_scores = beam_scores.reshape(-1)
+        hypotheses: List[List[Tuple[float, np.ndarray]]] = [[] for _ in range(batch)]
+        done = [False] * batch
+
+        def add(hyps, tokens, sum_logprobs):
+            hyps.append((sum_logprobs / (len(tokens) ** length_penalty), tokens))
+            if len(hyps) > num_beams:
+                hyps.remove(min(hyps, key=lambda hyp: hyp[0]))
+
+        while True:
+            logits, past = self._decode_step(sequences[:, -1:], attention_mask, cross, past)
+            scores = self._process(_log_softmax(logits), sequences, forced_bos, max_length)
+            vocab_size = scores.shape[-1]
+            scores = (scores + beam_scores[:, None]).reshape(batch, num_beams * vocab_size)
+            # Two candidates per beam, so every beam has one that is not EOS
+            top = np.argsort(-scores, axis=1, kind="stable")[:, :2 * num_beams]
+
+            next_scores = np.zeros((batch, num_beams), dtype=np.float32)
+            next_tokens = np.full((batch, num_beams), pad, dtype=np.int64)
+            next_rows = np.zeros((batch, num_beams), dtype=np.int64)
+            for b in range(batch):
+                next_rows[b] = b * num_beams
+                if done[b]:
+                    continue
+                kept = 0
+                for rank, candidate in enumerate(top[b]):
+                    row = b * num_beams + candidate // vocab_size
+                    token = candidate % vocab_size
+                    if token == eos:
+                        if rank < num_beams:
+                            add(hypotheses[b], sequences[row], float(scores[b, candidate]))
+                    else:
+                        next_scores[b, kept] = scores[b, candidate]
+                        next_tokens[b, kept] = token
+                        next_rows[b, kept] = row
+                        kept += 1
+                    if kept == num_beams:
+                        break
+                done[b] = len(hypotheses[b]) >= num_beams
+
+            rows = next_rows.reshape(-1)
+            beam_scores = next_scores.reshape(-1)
+            sequences = np.concatenate([sequences[rows], next_tokens.reshape(-1, 1)], axis=1)
+            past = [tensor[rows] for tensor in past]
+            if all(done) or sequences.shape[1] >= max_length:
+                break
+            if stop_at is not None and time.monotonic() >= stop_at:
+                break
+
+        results = []
+        for b in range(batch):
+            if not done[b]:
+                for beam in range(num_beams):
+                    row = b * num_beams + beam
+                    add(hypotheses[b], sequences[row], float(beam_scores[row]))
+            best = max(hypotheses[b], key=lambda hyp: hyp[0])[1]
+            if len(best) < max_length:
+                best = np.append(best, eos)
+            results.append(best)
+        return results
+
+    def stream_response(
+        self,
+        input_text: Union[str, List[int]],
+        language: str,
+        max_length: int = 100,
+        temperature: float = 0.7,
+        stop_event: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """Stream a greedy response as decoded text chunks, one step at a time.
+
+        The encoder runs on the first ``next``, so creating the stream does
+        no model work on the caller's thread (e.g. the event loop).
+        """
+        self.require_ready()
+        lang_code = self.language_codes.get(language)
+        if not lang_code:
+            raise ValueError(f"Unsupported language: {language}")
+        stop_event = stop_event or threading.Event()
+
+        def chunks():
+            sent = ""
+            try:
+                attention_mask, cross = self._run_encoder(self._encode([input_text]))
+                steps = self._greedy(attention_mask, cross, self._forced_bos_token_id(lang_code), max_length)
+                for sequences in steps:
+                    if stop_event.is_set():
+                        return
+                    tokens = torch.as_tensor(sequences[0])
+                    if self.vocab_map is not None:
+                        tokens = self.vocab_map.to_tokenizer(tokens)
+                    text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+                    if len(text) > len(sent):
+                        yield text[len(sent):]
+                        sent = text
+            finally:
+                stop_event.set()
+
+        return chunks()
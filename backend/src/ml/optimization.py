@@ -0,0 +1,206 @@
+import argparse
+import copy
+import io
+import json
+import logging
+import time
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+import torch
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+# Fixed prompt set used to compare a precision mode against fp32
+VALIDATION_PROMPTS = {
+    'hi': [
+        "नमस्ते, कैसे हो आप?",
+        "मुझे मदद चाहिए",
+        "धन्यवाद, आपका दिन शुभ हो",
+        "मुझे भूख लगी है, कोई अच्छा रेस्टोरेंट बताइए",
+    ],
+    'te': [
+        "నమస్కారం, ఎలా ఉన్నారు?",
+        "నాకు సహాయం కావాలి",
+        "ధన్యవాదాలు",
+        "నాకు ఆకలిగా ఉంది, మంచి హోటల్ చెప్పండి",
+    ],
+}
+
+logger = logging.getLogger(__name__)
+
+def configure_threads(
+    num_threads: Optional[int] = None,
+    num_interop_threads: Optional[int] = None
+):
+    """Set torch intra-op and inter-op thread counts when given."""
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work starts
+            logger.warning(f"Could not set inter-op threads: {str(e)}")
+
+def bf16_supported(device: str) -> bool:
+    """Return whether bf16 inference is natively supported on ``device``."""
+    if device.startswith("cuda"):
+        return torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def apply_precision(model, precision: str, device: str):
+    """Return ``model`` converted to the requested inference precision.
+
+    ``int8`` applies dynamic quantization to the Linear layers (CPU only) and
+    ``bf16`` casts the weights to bfloat16.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported precision: {precision}")
+
+    if precision == "int8":
+        if not device.startswith("cpu"):
+            raise ValueError("int8 dynamic quantization is only supported on CPU")
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    elif precision == "bf16":
+        if not bf16_supported(device):
+            raise ValueError(f"bf16 is not supported on this {device} device")
+        model = model.to(torch.bfloat16)
+    return model.eval()
+
+def model_size_bytes(model) -> int:
+    """Return the serialized size of the model weights in bytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def time_responses(
+    chatbot,
+    prompts: Dict[str, List[str]],
+    warmup: bool = True,
+    **generation_kwargs
+) -> Dict:
+    """Answer every prompt with the chatbot and return outputs and latency stats."""
+    # An untimed pass first, so neither model is timed cold
+    if warmup:
+        for language, texts in prompts.items():
+            for text in texts:
+                chatbot.generate_response(text, language, **generation_kwargs)
+
+    outputs, latencies = {}, []
+    for language, texts in prompts.items():
+        outputs[language] = []
+        for text in texts:
+            start = time.perf_counter()
+            outputs[language].append(chatbot.generate_response(text, language, **generation_kwargs))
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "outputs": outputs,
+        "latency_mean_s": sum(latencies) / len(latencies),
+        "latency_p50_s": latencies[len(latencies) // 2],
+        "latency_max_s": latencies[-1],
+    }
+
+def validate_precision(
+    model_path: str,
+    precision: str,
+    prompts: Optional[Dict[str, List[str]]] = None,
+    num_threads: Optional[int] = None,
+    num_interop_threads: Optional[int] = None
+) -> Dict:
+    """Compare a precision mode against fp32 on a fixed prompt set.
+
+    Reports per-prompt output agreement, latency and weight size for both
+    modes so a lower precision is never adopted without seeing its cost.
+    Each model answers the prompts once untimed before it is timed.
+    """
+    from ml.inference import MultilingualChatbot
+
+    prompts = prompts or VALIDATION_PROMPTS
+    baseline = MultilingualChatbot(
+        model_path,
+        device="cpu",
+        num_threads=num_threads,
+        num_interop_threads=num_interop_threads
+    )
+    prompts = {
+        lang: texts for lang, texts in prompts.items()
+        if lang in baseline.get_supported_languages()
+    }
+
+    # Reuse the already loaded weights rather than reading them twice
+    candidate = copy.copy(baseline)
+    candidate.model = apply_precision(copy.deepcopy(baseline.model), precision, "cpu")
+    candidate.precision = precision
+
+    reference = time_responses(baseline, prompts)
+    result = time_responses(candidate, prompts)
+
+    comparisons, exact = [], 0
+    for language, texts in prompts.items():
+        for text, expected, actual in zip(
+            texts, reference["outputs"][language], result["outputs"][language]
+        ):
+            exact += expected == actual
+            comparisons.append({
+                "language": language,
+                "input": text,
+                "fp32": expected,
+                precision: actual,
+                "exact_match": expected == actual,
+                "similarity": SequenceMatcher(None, expected, actual).ratio(),
+            })
+
+    baseline_size = model_size_bytes(baseline.model)
+    candidate_size = model_size_bytes(candidate.model)
+    return {
+        "precision": precision,
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "num_prompts": len(comparisons),
+        "exact_match_rate": exact / len(comparisons) if comparisons else 0.0,
+        "mean_similarity": (
+            sum(c["similarity"] for c in comparisons) / len(comparisons)
+            if comparisons else 0.0
+        ),
+        "latency": {
+            "fp32": {k: v for k, v in reference.items() if k != "outputs"},
+            precision: {k: v for k, v in result.items() if k != "outputs"},
+            "speedup": reference["latency_mean_s"] / result["latency_mean_s"],
+        },
+        "weight_bytes": {
+            "fp32": baseline_size,
+            precision: candidate_size,
+            "ratio": baseline_size / candidate_size,
+        },
+        "comparisons": comparisons,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare an inference precision mode against fp32."
+    )
+    parser.add_argument("--model-path", default="../../models/pretrained/finetuned_mbart")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--interop-threads", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = validate_precision(
+        args.model_path,
+        args.precision,
+        num_threads=args.threads,
+        num_interop_threads=args.interop_threads
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,64 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional, Sequence
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[str, float]:
+    """Return nearest-rank percentiles of ``samples`` keyed ``p50``, ``p95``..."""
+    if not samples:
+        return {f"p{point}": 0.0 for point in points}
+    ordered = sorted(samples)
+    return {
+        f"p{point}": ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))]
+        for point in points
+    }
+
+def summarize(latencies: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """Summarize latencies in seconds, reported in ms by default."""
+    summary = {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) * scale if latencies else 0.0,
+        "max": max(latencies) * scale if latencies else 0.0,
+    }
+    summary.update({k: v * scale for k, v in percentiles(latencies).items()})
+    return summary
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def environment() -> Dict:
+    """Describe the machine and commit a benchmark ran on."""
+    info = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+def write_results(name: str, results: Dict, output: Optional[str] = None) -> Dict:
+    """Wrap results with environment info, print them and optionally save as JSON."""
+    report = {"benchmark": name, "environment": environment(), "results": results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return report
@@ -0,0 +1,246 @@
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+class _Turn:
+    """One exchange; its text is tokenized once, on first use, into compact ids."""
+
+    __slots__ = ("message", "reply", "message_ids", "reply_ids")
+
+    def __init__(self, message: str, reply: str, message_ids: Optional[List[int]] = None):
+        self.message = message
+        self.reply = reply
+        self.message_ids = array("i", message_ids) if message_ids is not None else None
+        self.reply_ids = None
+
+    def ids(self, tokenize: Callable[[str], List[int]]) -> Tuple[array, array]:
+        if self.message_ids is None:
+            self.message_ids = array("i", tokenize(self.message))
+        if self.reply_ids is None:
+            self.reply_ids = array("i", tokenize(self.reply))
+        return self.message_ids, self.reply_ids
+
+    def nbytes(self) -> int:
+        size = len(self.message.encode("utf-8")) + len(self.reply.encode("utf-8"))
+        for ids in (self.message_ids, self.reply_ids):
+            if ids is not None:
+                size += len(ids) * ids.itemsize
+        return size
+
+class Session:
+    """A conversation: its most recent turns, oldest first."""
+
+    def __init__(self, session_id: str, max_turns: int = 8):
+        self.session_id = session_id
+        self.turns: Deque[_Turn] = deque(maxlen=max_turns)
+        self.created = time.time()
+        self.last_access = self.created
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the session's history."""
+        return sum(turn.nbytes() for turn in self.turns)
+
+    def history(self) -> List[Dict[str, str]]:
+        return [{"message": turn.message, "reply": turn.reply} for turn in self.turns]
+
+class SessionStore(ABC):
+    """Storage interface for sessions.
+
+    The in-process store below is the default; another backend (e.g. a
+    local stand-in for a shared cache) only needs these methods. ``put`` is
+    also called again when a stored session's size changes.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Session]:
+        """Return a stored session, or None if it is unknown or expired."""
+
+    @abstractmethod
+    def put(self, session: Session):
+        """Store a session, or update its stored size."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session; return whether it existed."""
+
+    def stats(self) -> Dict:
+        return {}
+
+class InMemorySessionStore(SessionStore):
+    """LRU session store with an idle TTL and a global memory cap.
+
+    Sessions idle longer than ``ttl_seconds`` expire. Once there are more
+    than ``max_sessions`` sessions or their history exceeds ``max_bytes``,
+    the least recently used sessions are evicted.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl_seconds: Optional[float] = 1800.0,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._counters = {"evictions": 0, "expirations": 0}
+
+    def get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self._expired(session, time.time()):
+            self._remove(session_id)
+            self._counters["expirations"] += 1
+            return None
+        session.last_access = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def put(self, session: Session):
+        session.last_access = time.time()
+        self._total_bytes -= self._bytes.get(session.session_id, 0)
+        self._bytes[session.session_id] = session.nbytes()
+        self._total_bytes += self._bytes[session.session_id]
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        self._evict(session.session_id)
+
+    def delete(self, session_id: str) -> bool:
+        if session_id not in self._sessions:
+            return False
+        self._remove(session_id)
+        return True
+
+    def _evict(self, keep: str):
+        """Expire idle sessions, then evict LRU sessions while over a limit."""
+        now = time.time()
+        # Least recently used first, so expired sessions sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.session_id == keep or not self._expired(oldest, now):
+                break
+            self._remove(oldest.session_id)
+            self._counters["expirations"] += 1
+
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, session_id: str):
+        del self._sessions[session_id]
+        self._total_bytes -= self._bytes.pop(session_id, 0)
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return self.ttl is not None and now - session.last_access > self.ttl
+
+    def stats(self) -> Dict:
+        return {
+            **self._counters,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+class SessionManager:
+    """Multi-turn context for the model, built incrementally per session.
+
+    Each message and reply is tokenized once and its ids are kept with the
+    turn, so a new turn only tokenizes the new message. The model input is
+    the cached ids of the last ``max_turns`` turns plus the message, trimmed
+    from the oldest side to ``max_context_tokens``. Encoder outputs are not
+    reused: the encoder attends in both directions, so every position's
+    state changes when text is appended.
+    """
+
+    def __init__(
+        self,
+        chatbot,
+        store: Optional[SessionStore] = None,
+        max_turns: int = 8,
+        max_context_tokens: int = 512
+    ):
+        self.chatbot = chatbot
+        self.store = store if store is not None else InMemorySessionStore()
+        self.max_turns = max_turns
+        self.max_context_tokens = max_context_tokens
+
+    def get(self, session_id: str) -> Session:
+        """Return the session, starting a new one if it is unknown or expired."""
+        session = self.store.get(session_id)
+        if session is None:
+            session = Session(session_id, self.max_turns)
+        return session
+
+    def tokenize(self, text: str) -> List[int]:
+        """Tokenize text without special tokens, as turns are stored."""
+        self.chatbot.require_ready()
+        return self.chatbot.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def context_ids(
+        self,
+        session: Session,
+        message: str,
+        message_ids: Optional[List[int]] = None
+    ) -> List[int]:
+        """Return model input ids for ``message`` following the session history.
+
+        Pass the message's ``tokenize`` ids to reuse them here and in
+        ``record``; each request keeps its own, so concurrent requests on
+        one session do not mix them up.
+        """
+        self.chatbot.require_ready()
+        tokenizer = self.chatbot.tokenizer
+        prefix, suffix = list(tokenizer.prefix_tokens), list(tokenizer.suffix_tokens)
+        separator = [tokenizer.eos_token_id]
+        budget = self.max_context_tokens - len(prefix) - len(suffix)
+
+        if message_ids is None:
+            message_ids = self.tokenize(message)
+        ids = list(message_ids[:budget])
+        tokenized = False
+        # Walk back through the history until the token budget runs out
+        for turn in reversed(session.turns):
+            tokenized |= turn.message_ids is None or turn.reply_ids is None
+            turn_message_ids, turn_reply_ids = turn.ids(self.tokenize)
+            turn_ids = list(turn_message_ids) + separator + list(turn_reply_ids) + separator
+            if len(ids) + len(turn_ids) > budget:
+                break
+            ids = turn_ids + ids
+        if tokenized and session.turns:
+            # Newly cached ids grow the session; let the store recount it
+            self.store.put(session)
+        return prefix + ids + suffix
+
+    def record(
+        self,
+        session: Session,
+        message: str,
+        reply: str,
+        message_ids: Optional[List[int]] = None
+    ):
+        """Append a finished turn to the session and store it."""
+        session.turns.append(_Turn(message, reply, message_ids))
+        self.store.put(session)
+
+    def delete(self, session_id: str) -> bool:
+        return self.store.delete(session_id)
+
+    def stats(self) -> Dict:
+        return {
+            **self.store.stats(),
+            "max_turns": self.max_turns,
+            "max_context_tokens": self.max_context_tokens,
+        }
@@ -1,14 +1,18 @@
+import argparse
+import json
 import os
 from transformers import (
     MBartForConditionalGeneration,
     MBart50TokenizerFast,
     Seq2SeqTrainingArguments,
-    Seq2SeqTrainer,
     DataCollatorForSeq2Seq
 )
-from datasets import load_from_disk
+from datasets import IterableDataset, load_from_disk
 import torch
+from typing import Dict, List, Optional, Tuple
 from utils import setup_logging
+from ml.data_preprocessing import DialoguePreprocessor
+from ml.bucketing import TokenBudgetBatchSampler, TokenThroughputTrainer, example_lengths
 import logging
 
 class MultilingualTrainer:
@@ -17,6 +21,7 @@ class MultilingualTrainer:
         model_name: str = "facebook/mbart-large-50-many-to-many-mmt",
         output_dir: str = "../../models/pretrained/finetuned_mbart"
     ):
+        self.model_name = model_name
         self.model = MBartForConditionalGeneration.from_pretrained(model_name)
         self.tokenizer = MBart50TokenizerFast.from_pretrained(model_name)
         self.output_dir = output_dir
@@ -29,6 +34,35 @@ class MultilingualTrainer:
         """Load preprocessed dataset."""
         return load_from_disk(data_path)
 
+    def load_streaming_datasets(
+        self,
+        raw_data_path: str,
+        eval_ratio: float = 0.05,
+        sampling_ratios: Optional[Dict[str, float]] = None,
+        seed: int = 42,
+        shuffle_buffer_size: int = 10000,
+        file_patterns: Optional[Dict[str, List[str]]] = None
+    ) -> Tuple[IterableDataset, IterableDataset]:
+        """Stream train and eval splits straight from the raw dialogue files.
+
+        The split is decided per dialogue on the fly, so no pre-split
+        ``processed/train`` and ``processed/eval`` directories are needed.
+        """
+        preprocessor = DialoguePreprocessor(self.model_name, tokenizer=self.tokenizer)
+        train_dataset, eval_dataset = (
+            preprocessor.stream_dataset(
+                raw_data_path,
+                split=split,
+                eval_ratio=eval_ratio,
+                sampling_ratios=sampling_ratios,
+                seed=seed,
+                file_patterns=file_patterns
+            )
+            for split in ("train", "eval")
+        )
+        train_dataset = train_dataset.shuffle(seed=seed, buffer_size=shuffle_buffer_size)
+        return train_dataset, eval_dataset
+
     def train(
         self,
         train_dataset,
@@ -36,11 +70,46 @@ class MultilingualTrainer:
         batch_size: int = 8,
         num_epochs: int = 3,
         learning_rate: float = 2e-5,
+        max_steps: int = -1,
+        max_tokens_per_batch: Optional[int] = None,
+        bucket_width: int = 8,
+        language_temperature: float = 1.0,
+        seed: int = 42,
     ):
-        """Fine-tune the model on the dialogue dataset."""
+        """Fine-tune the model on the dialogue dataset.
+
+        Streaming (iterable) training datasets have no length, so they need
+        ``max_steps``. With ``max_tokens_per_batch``, training batches are
+        built from length buckets under a padded source+target token budget
+        instead of ``batch_size`` examples, and ``language_temperature`` > 1
+        upsamples languages with few batches.
+        """
+        if isinstance(train_dataset, IterableDataset) and max_steps <= 0:
+            raise ValueError("max_steps must be set when training on a streaming dataset")
+
+        batch_sampler = None
+        if max_tokens_per_batch:
+            if isinstance(train_dataset, IterableDataset):
+                raise ValueError("Token-budget batching needs a map-style dataset")
+            source_lengths, target_lengths, languages = example_lengths(train_dataset)
+            batch_sampler = TokenBudgetBatchSampler(
+                source_lengths,
+                languages,
+                target_lengths=target_lengths,
+                max_tokens=max_tokens_per_batch,
+                bucket_width=bucket_width,
+                language_temperature=language_temperature,
+                seed=seed
+            )
+            self.logger.info(
+                f"Token-budget batching: {len(batch_sampler)} batches of "
+                f"at most {max_tokens_per_batch} padded tokens"
+            )
+
         training_args = Seq2SeqTrainingArguments(
             output_dir=self.output_dir,
             num_train_epochs=num_epochs,
+            max_steps=max_steps,
             per_device_train_batch_size=batch_size,
             per_device_eval_batch_size=batch_size,
             warmup_steps=500,
@@ -54,6 +123,7 @@ class MultilingualTrainer:
             learning_rate=learning_rate,
             fp16=torch.cuda.is_available(),
             gradient_accumulation_steps=4,
+            seed=seed,
         )
 
         # Create data collator
@@ -63,14 +133,15 @@ class MultilingualTrainer:
             padding=True
         )
 
-        # Initialize trainer
-        trainer = Seq2SeqTrainer(
+        # Initialize trainer; it also logs tokens/sec and padding efficiency
+        trainer = TokenThroughputTrainer(
             model=self.model,
             args=training_args,
             train_dataset=train_dataset,
             eval_dataset=eval_dataset,
             data_collator=data_collator,
             tokenizer=self.tokenizer,
+            batch_sampler=batch_sampler,
         )
 
         # Start training
@@ -83,11 +154,41 @@ class MultilingualTrainer:
         self.logger.info(f"Model saved to {self.output_dir}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune mBART on the dialogue dataset.")
+    parser.add_argument("--data-path", default="../../data/processed",
+                        help="Directory with preprocessed train/ and eval/ splits")
+    parser.add_argument("--stream-from", default=None,
+                        help="Stream and split the raw dialogue files in this directory instead")
+    parser.add_argument("--eval-ratio", type=float, default=0.05)
+    parser.add_argument("--sampling-ratios", type=json.loads, default=None,
+                        help='Per-language train sampling ratios as JSON, e.g. \'{"te": 2.0}\'')
+    parser.add_argument("--max-steps", type=int, default=-1,
+                        help="Number of training steps (required with --stream-from)")
+    parser.add_argument("--max-tokens-per-batch", type=int, default=None)
+    parser.add_argument("--language-temperature", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
     trainer = MultilingualTrainer()
-    
+
     # Load datasets
-    train_dataset = trainer.load_dataset("../../data/processed/train")
-    eval_dataset = trainer.load_dataset("../../data/processed/eval")
-    
+    if args.stream_from:
+        train_dataset, eval_dataset = trainer.load_streaming_datasets(
+            args.stream_from,
+            eval_ratio=args.eval_ratio,
+            sampling_ratios=args.sampling_ratios,
+            seed=args.seed
+        )
+    else:
+        train_dataset = trainer.load_dataset(os.path.join(args.data_path, "train"))
+        eval_dataset = trainer.load_dataset(os.path.join(args.data_path, "eval"))
+
     # Start training
-    trainer.train(train_dataset, eval_dataset) 
\ No newline at end of file
+    trainer.train(
+        train_dataset,
+        eval_dataset,
+        max_steps=args.max_steps,
+        max_tokens_per_batch=args.max_tokens_per_batch,
+        language_temperature=args.language_temperature,
+        seed=args.seed
+    )
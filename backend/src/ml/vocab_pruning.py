@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import time
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+import torch
+from transformers import MBartForConditionalGeneration, MBart50TokenizerFast
+
+VOCAB_MAP_FILE = "vocab_map.json"
+
+class VocabMap:
+    """Mapping between the full tokenizer vocabulary and a pruned model's ids.
+
+    ``kept_ids[new_id]`` is the tokenizer id of a pruned model row. Tokenizer
+    ids that were pruned map to the pruned model's ``<unk>``.
+    """
+
+    def __init__(self, kept_ids: List[int], tokenizer_vocab_size: int, unk_token_id: int):
+        self.kept_ids = list(kept_ids)
+        self.tokenizer_vocab_size = tokenizer_vocab_size
+        self.unk_token_id = unk_token_id
+
+        self.new_to_old = torch.tensor(self.kept_ids, dtype=torch.long)
+        self.old_to_new = torch.full(
+            (tokenizer_vocab_size,), self.kept_ids.index(unk_token_id), dtype=torch.long
+        )
+        self.old_to_new[self.new_to_old] = torch.arange(len(self.kept_ids))
+
+    def __len__(self) -> int:
+        return len(self.kept_ids)
+
+    def to(self, device) -> "VocabMap":
+        self.new_to_old = self.new_to_old.to(device)
+        self.old_to_new = self.old_to_new.to(device)
+        return self
+
+    def to_model(self, ids):
+        """Map tokenizer ids (int or tensor) to pruned model ids."""
+        if isinstance(ids, int):
+            return int(self.old_to_new[ids])
+        return self.old_to_new[ids]
+
+    def to_tokenizer(self, ids):
+        """Map pruned model ids (int or tensor) back to tokenizer ids."""
+        if isinstance(ids, int):
+            return int(self.new_to_old[ids])
+        return self.new_to_old[ids]
+
+    def save(self, directory: str):
+        with open(os.path.join(directory, VOCAB_MAP_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                "kept_ids": self.kept_ids,
+                "tokenizer_vocab_size": self.tokenizer_vocab_size,
+                "unk_token_id": self.unk_token_id,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["VocabMap"]:
+        """Load the map saved next to a pruned model, or None if unpruned."""
+        path = os.path.join(directory, VOCAB_MAP_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["kept_ids"], data["tokenizer_vocab_size"], data["unk_token_id"])
+
+def collect_token_ids(
+    tokenizer,
+    texts: Iterable[str],
+    batch_size: int = 256
+) -> set:
+    """Return every tokenizer id used by ``texts`` plus all special tokens."""
+    used = set(tokenizer.all_special_ids)
+    used.update(tokenizer.lang_code_to_id.values())
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) == batch_size:
+            for ids in tokenizer(batch, truncation=True, max_length=512)["input_ids"]:
+                used.update(ids)
+            batch = []
+    if batch:
+        for ids in tokenizer(batch, truncation=True, max_length=512)["input_ids"]:
+            used.update(ids)
+    return used
+
+def prune_model(model: MBartForConditionalGeneration, vocab_map: VocabMap):
+    """Restrict the model's embeddings, LM head and logit bias to ``vocab_map``."""
+    kept = vocab_map.new_to_old.to(model.device)
+    old_embeddings = model.get_input_embeddings()
+
+    embeddings = torch.nn.Embedding(
+        len(vocab_map),
+        old_embeddings.embedding_dim,
+        padding_idx=vocab_map.to_model(model.config.pad_token_id)
+    ).to(device=model.device, dtype=old_embeddings.weight.dtype)
+    embeddings.weight.data = old_embeddings.weight.data[kept].clone()
+    model.set_input_embeddings(embeddings)
+
+    lm_head = torch.nn.Linear(
+        old_embeddings.embedding_dim, len(vocab_map), bias=False
+    ).to(device=model.device, dtype=old_embeddings.weight.dtype)
+    lm_head.weight.data = model.lm_head.weight.data[kept].clone()
+    model.lm_head = lm_head
+    model.final_logits_bias = model.final_logits_bias[:, kept].clone()
+    model.tie_weights()
+
+    # Special token ids in the config must point at the pruned rows
+    for config in (model.config, model.generation_config):
+        for name in (
+            "pad_token_id", "bos_token_id", "eos_token_id",
+            "decoder_start_token_id", "forced_bos_token_id", "forced_eos_token_id"
+        ):
+            value = getattr(config, name, None)
+            if isinstance(value, int):
+                setattr(config, name, vocab_map.to_model(value))
+    model.config.vocab_size = len(vocab_map)
+    return model
+
+def _parameter_bytes(model) -> int:
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+def _mean_generate_seconds(chatbot, samples: List[Dict]) -> float:
+    start = time.perf_counter()
+    for sample in samples:
+        chatbot.generate_response(sample["input"], sample["language"])
+    return (time.perf_counter() - start) / max(len(samples), 1)
+
+def prune_vocabulary(
+    model_path: str,
+    corpus_path: str,
+    output_path: str,
+    num_latency_samples: int = 8
+) -> Dict:
+    """Prune a model's vocabulary to the tokens used by a dialogue corpus.
+
+    Saves the pruned model, the tokenizer and the id map to ``output_path``;
+    the result loads through ``MultilingualChatbot(model_path=output_path)``.
+    Returns a report of the vocabulary, memory and latency savings.
+    """
+    from ml.data_preprocessing import DialoguePreprocessor
+    from ml.inference import MultilingualChatbot
+
+    tokenizer = MBart50TokenizerFast.from_pretrained(model_path)
+    preprocessor = DialoguePreprocessor(model_path, tokenizer=tokenizer)
+    counts = {"dialogues": 0}
+
+    def texts():
+        for dialogue in preprocessor.iter_dialogues(corpus_path):
+            counts["dialogues"] += 1
+            yield dialogue["input"]
+            yield dialogue["response"]
+
+    kept_ids = sorted(collect_token_ids(tokenizer, texts()))
+    if not counts["dialogues"]:
+        raise ValueError(f"No dialogues found under {corpus_path}")
+    vocab_map = VocabMap(kept_ids, len(tokenizer), tokenizer.unk_token_id)
+
+    model = MBartForConditionalGeneration.from_pretrained(model_path)
+    params_before = _parameter_bytes(model)
+    vocab_before = model.config.vocab_size
+    prune_model(model, vocab_map)
+
+    os.makedirs(output_path, exist_ok=True)
+    model.save_pretrained(output_path)
+    tokenizer.save_pretrained(output_path)
+    vocab_map.save(output_path)
+
+    samples = list(islice(preprocessor.iter_dialogues(corpus_path), num_latency_samples))
+    latency_before = _mean_generate_seconds(MultilingualChatbot(model_path, device="cpu"), samples)
+    latency_after = _mean_generate_seconds(MultilingualChatbot(output_path, device="cpu"), samples)
+
+    report = {
+        "vocab_size": {"before": vocab_before, "after": len(vocab_map)},
+        "parameter_bytes": {"before": params_before, "after": _parameter_bytes(model)},
+        "mean_generate_seconds": {"before": latency_before, "after": latency_after},
+        "num_dialogues": counts["dialogues"],
+    }
+    with open(os.path.join(output_path, "pruning_report.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prune the model vocabulary to the tokens used by a corpus."
+    )
+    parser.add_argument("--model-path", default="../../models/pretrained/finetuned_mbart")
+    parser.add_argument("--corpus-path", default="../../data/raw")
+    parser.add_argument("--output-path", default="../../models/pretrained/finetuned_mbart_pruned")
+    args = parser.parse_args()
+
+    print(json.dumps(
+        prune_vocabulary(args.model_path, args.corpus_path, args.output_path),
+        indent=2
+    ))
@@ -0,0 +1,484 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from transformers import MBart50TokenizerFast
+
+from metrics import MODEL_MEMORY_BYTES, drain_samples, merge_samples
+from ml.inference import LANGUAGE_CODES, ModelNotReadyError
+
+# How long past a deadline to wait for a worker's reply
+DEADLINE_GRACE_SECONDS = 1.0
+
+# Errors re-raised in the front process with their original type
+_ERROR_TYPES = {"ValueError": ValueError, "ModelNotReadyError": ModelNotReadyError}
+
+def _worker_main(worker_id: int, options: Dict, requests, responses):
+    """Entry point of an inference worker process.
+
+    Requests are ``(kind, request_id, args, kwargs)`` tuples; ``kind`` is a
+    MultilingualChatbot method name, ``"stream"`` or ``"cancel"``. Work runs
+    on one thread so this loop stays free to receive cancellations.
+    """
+    cores = options.get("cores")
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    from ml.inference import MultilingualChatbot
+    from ml.onnx_inference import OnnxChatbot
+    from utils import setup_logging_from_env
+
+    # One log file per worker; processes must not rotate a shared file
+    setup_logging_from_env(file_name=f"worker_{worker_id}.log")
+
+    chatbot_class = OnnxChatbot if options.get("backend") == "onnx" else MultilingualChatbot
+    try:
+        chatbot = chatbot_class(
+            options["model_path"],
+            device="cpu",
+            precision=options["precision"],
+            num_threads=len(cores) if cores else options.get("num_threads"),
+            num_interop_threads=1,
+            use_mmap=options["use_mmap"]
+        )
+        # Restarted workers warm up before taking traffic
+        if options.get("warmup"):
+            chatbot.warmup(*options["warmup"])
+    except Exception as e:
+        responses.put(("failed", None, str(e), None))
+        return
+    info = {
+        "pid": os.getpid(),
+        "cores": cores,
+        "model_memory_bytes": chatbot.model_bytes,
+    }
+    responses.put(("ready", None, info, drain_samples()))
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    stop_events: Dict[int, threading.Event] = {}
+
+    def handle(kind: str, request_id: int, args, kwargs):
+        try:
+            if kind == "stream":
+                stop_event = stop_events[request_id]
+                for chunk in chatbot.stream_response(*args, stop_event=stop_event, **kwargs):
+                    responses.put(("chunk", request_id, chunk, None))
+                result = None
+            else:
+                result = getattr(chatbot, kind)(*args, **kwargs)
+            responses.put(("result", request_id, result, drain_samples()))
+        except Exception as e:
+            responses.put(("error", request_id, (type(e).__name__, str(e)), drain_samples()))
+        finally:
+            stop_events.pop(request_id, None)
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        kind, request_id, args, kwargs = message
+        if kind == "cancel":
+            stop_event = stop_events.get(request_id)
+            if stop_event is not None:
+                stop_event.set()
+            continue
+        if kind == "stream":
+            stop_events[request_id] = threading.Event()
+        executor.submit(handle, kind, request_id, args, kwargs)
+    executor.shutdown(wait=False)
+
+class _Worker:
+    """Front-process handle on one inference worker process."""
+
+    def __init__(self, worker_id: int, cores: Optional[List[int]]):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.process = None
+        self.requests = None
+        self.responses = None
+        self.ready = threading.Event()
+        self.failed: Optional[str] = None
+        self.restarts = -1
+        # Restarts since the worker was last ready, and when the next may happen
+        self.failures = 0
+        self.next_start = 0.0
+        self.gave_up = False
+        self.model_bytes = 0
+        self.in_flight = 0
+
+class WorkerPool:
+    """Pool of inference worker processes behind a MultilingualChatbot interface.
+
+    Each worker is pinned to its own slice of cores, runs torch with one
+    intra-op thread per core and loads the model from memory-mapped
+    safetensors, so the fp32 weights are shared through the page cache
+    instead of copied per process (int8 and bf16 convert, and so copy, per
+    worker). Calls are dispatched over per-worker IPC queues to the ready
+    worker with the fewest requests in flight. Workers that die or fail to
+    load are restarted with exponential backoff (``restart_backoff`` doubling
+    up to ``max_restart_backoff``) and given up on after ``max_restarts``
+    restarts without becoming ready. Restarted workers are warmed up with
+    the prompts last passed to ``warmup`` before they take traffic again,
+    and their in-flight requests fail. Calls with a
+    deadline stop waiting for the worker when it passes. With
+    ``backend="onnx"`` workers run an OnnxChatbot from an exported ONNX
+    model directory.
+
+    The pool can stand in for the chatbot in a BatchingEngine; give the
+    engine one concurrent batch per worker.
+    """
+
+    def __init__(
+        self,
+        num_workers: int,
+        model_path: str = "../../models/pretrained/finetuned_mbart",
+        precision: str = "fp32",
+        cores_per_worker: Optional[int] = None,
+        use_mmap: bool = True,
+        health_interval: float = 1.0,
+        backend: str = "torch",
+        max_restarts: int = 5,
+        restart_backoff: float = 1.0,
+        max_restart_backoff: float = 60.0
+    ):
+        self.num_workers = num_workers
+        self.model_path = model_path
+        self.health_interval = health_interval
+        self.max_restarts = max_restarts
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.logger = logging.getLogger(__name__)
+
+        self.options = {
+            "model_path": model_path,
+            "precision": precision,
+            "use_mmap": use_mmap,
+            "backend": backend,
+        }
+        self.tokenizer = None
+        self.language_codes = dict(LANGUAGE_CODES)
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        cores_per_worker = cores_per_worker or max(len(cores) // num_workers, 1)
+        self.workers = [
+            _Worker(i, cores[i * cores_per_worker:(i + 1) * cores_per_worker] or None)
+            for i in range(num_workers)
+        ]
+        if len(cores) < num_workers * cores_per_worker:
+            self.logger.warning(
+                f"{num_workers} workers x {cores_per_worker} cores exceeds the "
+                f"{len(cores)} available cores; some workers are not pinned"
+            )
+
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._pending: Dict[int, tuple] = {}
+        self._ids = itertools.count()
+        self._closed = False
+        self._monitor = None
+
+    def load(self):
+        """Start every worker and wait until they have loaded the model."""
+        self.tokenizer = MBart50TokenizerFast.from_pretrained(self.model_path)
+        for worker in self.workers:
+            self._start(worker)
+        for worker in self.workers:
+            while not worker.ready.is_set() and worker.failed is None:
+                if not worker.process.is_alive():
+                    worker.failed = f"exited with code {worker.process.exitcode}"
+                    break
+                time.sleep(0.05)
+        failed = [w for w in self.workers if w.failed is not None]
+        if len(failed) == len(self.workers):
+            raise RuntimeError(f"All inference workers failed to load: {failed[0].failed}")
+        for worker in failed:
+            self.logger.error(f"Worker {worker.worker_id} failed to load, will retry: {worker.failed}")
+
+        self._monitor = threading.Thread(target=self._watch, name="worker-monitor", daemon=True)
+        self._monitor.start()
+
+    def _start(self, worker: _Worker):
+        worker.ready.clear()
+        worker.failed = None
+        worker.next_start = 0.0
+        worker.restarts += 1
+        worker.requests = self._context.Queue()
+        worker.responses = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.worker_id, dict(self.options, cores=worker.cores),
+                  worker.requests, worker.responses),
+            name=f"inference-worker-{worker.worker_id}",
+            daemon=True
+        )
+        worker.process.start()
+        threading.Thread(
+            target=self._read, args=(worker, worker.responses),
+            name=f"worker-reader-{worker.worker_id}", daemon=True
+        ).start()
+
+    def _read(self, worker: _Worker, responses):
+        """Deliver one worker's responses until it is replaced or the pool closes."""
+        while not self._closed and worker.responses is responses:
+            try:
+                kind, request_id, payload, samples = responses.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if samples:
+                merge_samples(samples)
+
+            if kind == "ready":
+                worker.model_bytes = payload["model_memory_bytes"]
+                worker.failures = 0
+                worker.ready.set()
+                self._update_memory()
+                self.logger.info(f"Worker {worker.worker_id} ready: {payload}")
+                continue
+            if kind == "failed":
+                worker.failed = payload
+                continue
+
+            with self._lock:
+                entry = self._pending.get(request_id)
+                if entry is not None and kind != "chunk":
+                    del self._pending[request_id]
+                    worker.in_flight -= 1
+            if entry is None:
+                continue
+            sink = entry[1]
+            if kind == "chunk":
+                sink.put(("chunk", payload))
+            elif isinstance(sink, Future):
+                if kind == "result":
+                    sink.set_result(payload)
+                else:
+                    sink.set_exception(self._error(payload))
+            else:
+                sink.put((kind, payload))
+
+    def _update_memory(self):
+        """Report the model memory of every ready worker combined."""
+        MODEL_MEMORY_BYTES.set(sum(w.model_bytes for w in self.workers if w.ready.is_set()))
+
+    def _watch(self):
+        """Restart workers whose process died or failed to load, with backoff."""
+        while not self._closed:
+            time.sleep(self.health_interval)
+            for worker in self.workers:
+                if self._closed or worker.gave_up:
+                    continue
+                if worker.process.is_alive() and worker.failed is None:
+                    continue
+                # next_start is reset by each start, so a stop is handled once
+                if worker.next_start == 0.0:
+                    self._stopped(worker)
+                if worker.gave_up or time.monotonic() < worker.next_start:
+                    continue
+                self.logger.info(f"Restarting worker {worker.worker_id} (attempt {worker.failures})")
+                self._start(worker)
+
+    def _stopped(self, worker: _Worker):
+        """Handle a worker that died or failed: fail its requests and schedule a restart."""
+        reason = worker.failed or f"exited with code {worker.process.exitcode}"
+        worker.ready.clear()
+        self._update_memory()
+        self._fail_pending(worker, RuntimeError("Inference worker died"))
+        worker.failures += 1
+        if worker.failures > self.max_restarts:
+            worker.gave_up = True
+            self.logger.error(
+                f"Worker {worker.worker_id} {reason}; giving up after "
+                f"{self.max_restarts} restarts"
+            )
+            return
+        delay = min(self.restart_backoff * 2 ** (worker.failures - 1), self.max_restart_backoff)
+        worker.next_start = time.monotonic() + delay
+        self.logger.error(f"Worker {worker.worker_id} {reason}; restarting in {delay:.1f}s")
+
+    def _fail_pending(self, worker: _Worker, error: Exception):
+        with self._lock:
+            lost = [rid for rid, (wid, _) in self._pending.items() if wid == worker.worker_id]
+            sinks = [self._pending.pop(rid)[1] for rid in lost]
+            worker.in_flight = 0
+        for sink in sinks:
+            if isinstance(sink, Future):
+                sink.set_exception(error)
+            else:
+                sink.put(("error", (type(error).__name__, str(error))))
+
+    @staticmethod
+    def _error(payload) -> Exception:
+        name, message = payload
+        return _ERROR_TYPES.get(name, RuntimeError)(message)
+
+    def _submit(self, kind: str, args, kwargs, sink, worker: Optional[_Worker] = None) -> tuple:
+        """Send a request to ``worker`` or the least-loaded ready worker."""
+        with self._lock:
+            if worker is None:
+                ready = [w for w in self.workers if w.ready.is_set()]
+                if not ready:
+                    raise ModelNotReadyError("No inference worker is ready")
+                worker = min(ready, key=lambda w: w.in_flight)
+            request_id = next(self._ids)
+            self._pending[request_id] = (worker.worker_id, sink)
+            worker.in_flight += 1
+        worker.requests.put((kind, request_id, args, kwargs))
+        return worker, request_id
+
+    def _call(
+        self,
+        kind: str,
+        *args,
+        worker: Optional[_Worker] = None,
+        timeout: Optional[float] = None,
+        **kwargs
+    ):
+        future = Future()
+        worker, request_id = self._submit(kind, args, kwargs, future, worker=worker)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Stop tracking the request; a late reply is dropped by the reader
+            with self._lock:
+                if self._pending.pop(request_id, None) is not None:
+                    worker.in_flight -= 1
+            raise TimeoutError(f"Worker {worker.worker_id} did not reply before the deadline")
+
+    def is_ready(self) -> bool:
+        """Return whether at least one worker can take requests."""
+        return any(worker.ready.is_set() for worker in self.workers)
+
+    def require_ready(self):
+        """Raise ModelNotReadyError until a worker is ready."""
+        if not self.is_ready():
+            raise ModelNotReadyError("Model is still loading")
+
+    def warmup(self, prompts: Dict[str, List[str]], beam_sizes: List[int] = (1, 5)):
+        """Warm up every ready worker with the same prompts.
+
+        Workers restarted later run the same warmup before reporting ready.
+        """
+        self.options["warmup"] = (prompts, list(beam_sizes))
+        for worker in self.workers:
+            if worker.ready.is_set():
+                self._call("warmup", prompts, list(beam_sizes), worker=worker)
+
+    def generate_response(self, input_text: str, language: str, **kwargs) -> str:
+        """Generate a response on the least-loaded worker."""
+        try:
+            return self.generate_batch([input_text], language, **kwargs)[0]
+        except Exception as e:
+            self.logger.error(f"Error generating response: {str(e)}")
+            return f"Error: {str(e)}"
+
+    def generate_batch(
+        self,
+        input_texts: List[Union[str, List[int]]],
+        language: str,
+        deadline: Optional[float] = None,
+        **kwargs
+    ) -> Union[List[str], Tuple[List[str], List[int]]]:
+        """Generate a batch on the least-loaded worker.
+
+        Blocks until done or, with a ``time.monotonic()`` ``deadline``, until
+        shortly after it; the worker also stops decoding at the deadline.
+        Returns what the worker's ``generate_batch`` returns for ``kwargs``.
+        """
+        if language not in self.language_codes:
+            raise ValueError(f"Unsupported language: {language}")
+        timeout = None
+        if deadline is not None:
+            # Grace for the worker to return what it decoded by the deadline
+            timeout = max(deadline - time.monotonic(), 0.0) + DEADLINE_GRACE_SECONDS
+        return self._call(
+            "generate_batch", list(input_texts), language,
+            timeout=timeout, deadline=deadline, **kwargs
+        )
+
+    def stream_response(
+        self,
+        input_text: Union[str, List[int]],
+        language: str,
+        stop_event: Optional[threading.Event] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """Stream a response from the least-loaded worker.
+
+        Setting ``stop_event`` or closing the iterator cancels generation in
+        the worker.
+        """
+        if language not in self.language_codes:
+            raise ValueError(f"Unsupported language: {language}")
+        stop_event = stop_event or threading.Event()
+        chunks: "queue.Queue" = queue.Queue()
+        worker, request_id = self._submit("stream", (input_text, language), kwargs, chunks)
+
+        def cancel_on_stop():
+            stop_event.wait()
+            with self._lock:
+                still_running = request_id in self._pending
+            if still_running and worker.process.is_alive():
+                worker.requests.put(("cancel", request_id, None, None))
+
+        threading.Thread(target=cancel_on_stop, daemon=True).start()
+
+        def stream():
+            try:
+                while True:
+                    kind, payload = chunks.get()
+                    if kind == "chunk":
+                        yield payload
+                    elif kind == "error":
+                        raise self._error(payload)
+                    else:
+                        return
+            finally:
+                stop_event.set()
+
+        return stream()
+
+    def get_supported_languages(self) -> list:
+        """Return list of supported languages."""
+        return list(self.language_codes.keys())
+
+    def stats(self) -> Dict:
+        """Return per-worker state, load and restart counts."""
+        return {
+            "workers": [
+                {
+                    "worker": worker.worker_id,
+                    "pid": worker.process.pid if worker.process else None,
+                    "alive": bool(worker.process and worker.process.is_alive()),
+                    "ready": worker.ready.is_set(),
+                    "cores": worker.cores,
+                    "in_flight": worker.in_flight,
+                    "restarts": worker.restarts,
+                    "failed": worker.failed,
+                    "gave_up": worker.gave_up,
+                }
+                for worker in self.workers
+            ]
+        }
+
+    def close(self):
+        """Stop every worker process."""
+        self._closed = True
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.requests.put(None)
+            except (OSError, ValueError):
+                pass
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
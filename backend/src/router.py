@@ -0,0 +1,122 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+from metrics import RULE_MATCHES
+
+class HybridRouter:
+    """Route chat messages to the rule engine first and the model second.
+
+    A rule hit is answered immediately. Messages that match no rule (or only
+    the language's ``default`` reply) fall through to the batching engine,
+    unless the model does not serve that language, in which case the
+    default reply is returned. With no matchers every message goes to the
+    model.
+    """
+
+    TIERS = ("rules", "model")
+
+    def __init__(
+        self,
+        matchers: Dict,
+        engine,
+        model_languages: Iterable[str],
+        policy=None,
+        sessions=None
+    ):
+        self.matchers = matchers
+        self.engine = engine
+        self.policy = policy
+        self.sessions = sessions
+        self.model_languages = list(model_languages)
+        self._hits: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def supported_languages(self) -> list:
+        """Return languages served by either tier."""
+        languages = list(self.model_languages)
+        languages += [lang for lang in self.matchers if lang not in self.model_languages]
+        return languages
+
+    def metric_language(self, language: str) -> str:
+        """Return ``language`` if either tier serves it, else "other", for metric labels."""
+        if language in self.model_languages or language in self.matchers:
+            return language
+        return "other"
+
+    def match_rules(self, message: str, language: str) -> Optional[str]:
+        """Return the rule-engine reply, or None if the model should answer."""
+        matcher = self.matchers.get(language)
+        if matcher is not None:
+            category, response = matcher.match(message)
+            RULE_MATCHES.inc(category=category, language=self.metric_language(language))
+            if category != "default" or language not in self.model_languages:
+                self.record("rules", language)
+                return response
+        return None
+
+    def record(self, tier: str, language: str):
+        """Count a request answered by ``tier``."""
+        self._hits[(tier, self.metric_language(language))] += 1
+
+    async def route(
+        self,
+        message: str,
+        language: str,
+        latency_budget_ms: Optional[float] = None,
+        quality: Optional[str] = None,
+        deadline: Optional[float] = None,
+        session=None
+    ) -> Tuple[str, str]:
+        """Return ``(response, tier)`` for a message.
+
+        With a decoding policy, the latency budget and quality tier pick the
+        model's decoding parameters; otherwise the model defaults are used.
+        ``deadline`` (``time.monotonic()``) bounds the wait for the model.
+        ``session`` is a Session from ``sessions`` to continue.
+        """
+        response = self.match_rules(message, language)
+        if response is not None:
+            if session is not None:
+                self.sessions.record(session, message, response)
+            return response, "rules"
+
+        decoding = {}
+        if self.policy is not None:
+            choice = self.policy.choose(latency_budget_ms, quality)
+            decoding = {"num_beams": choice["num_beams"], "max_length": choice["max_length"]}
+        model_input, message_ids = message, None
+        if session is not None:
+            message_ids = self.sessions.tokenize(message)
+            model_input = self.sessions.context_ids(session, message, message_ids)
+        response = await self.engine.submit(model_input, language, deadline=deadline, **decoding)
+        if session is not None:
+            self.sessions.record(session, message, response, message_ids)
+        self.record("model", language)
+        return response, "model"
+
+    def stats(self) -> Dict:
+        """Return request counts and hit ratios per tier and per language."""
+        totals = {tier: 0 for tier in self.TIERS}
+        languages: Dict[str, Dict] = {}
+        for (tier, language), count in self._hits.items():
+            totals[tier] += count
+            entry = languages.setdefault(
+                language, {"requests": 0, "tiers": {t: 0 for t in self.TIERS}}
+            )
+            entry["requests"] += count
+            entry["tiers"][tier] += count
+
+        def ratios(counts: Dict[str, int]) -> Dict[str, float]:
+            total = sum(counts.values())
+            return {tier: (count / total if total else 0.0) for tier, count in counts.items()}
+
+        for entry in languages.values():
+            entry["hit_ratio"] = ratios(entry["tiers"])
+        stats = {
+            "requests": sum(totals.values()),
+            "tiers": totals,
+            "hit_ratio": ratios(totals),
+            "languages": languages,
+        }
+        if self.policy is not None:
+            stats["decoding"] = self.policy.stats()
+        return stats
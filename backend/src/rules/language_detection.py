@@ -0,0 +1,93 @@
+import unicodedata
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Iterable, Optional
+
+# Unicode blocks mapped to the language we serve in that script
+_SCRIPT_RANGES = sorted([
+    (0x0900, 0x097F, "hi"),   # Devanagari
+    (0x0980, 0x09FF, "bn"),   # Bengali
+    (0x0A80, 0x0AFF, "gu"),   # Gujarati
+    (0x0B80, 0x0BFF, "ta"),   # Tamil
+    (0x0C00, 0x0C7F, "te"),   # Telugu
+    (0x0C80, 0x0CFF, "kn"),   # Kannada
+    (0x0D00, 0x0D7F, "ml"),   # Malayalam
+    (0x1100, 0x11FF, "ko"),   # Hangul Jamo
+    (0x1200, 0x139F, "am"),   # Ethiopic (+ supplement)
+    (0x2D80, 0x2DDF, "am"),   # Ethiopic extended
+    (0x3040, 0x30FF, "ja"),   # Hiragana and Katakana
+    (0x3130, 0x318F, "ko"),   # Hangul compatibility Jamo
+    (0x3400, 0x4DBF, "zh"),   # CJK extension A
+    (0x4E00, 0x9FFF, "zh"),   # CJK unified ideographs
+    (0xAC00, 0xD7AF, "ko"),   # Hangul syllables
+    (0xF900, 0xFAFF, "zh"),   # CJK compatibility ideographs
+])
+_RANGE_STARTS = [start for start, _, _ in _SCRIPT_RANGES]
+
+# Latin letters specific to the West African languages langdetect lacks
+_LATIN_HINTS = {
+    "ɓ": "ha", "ɗ": "ha", "ƙ": "ha", "ƴ": "ha",
+    "ị": "ig", "ụ": "ig", "ṅ": "ig",
+    "ẹ": "yo", "ṣ": "yo",
+}
+
+# Only the first characters are scanned, which bounds the cost per message
+_SCAN_CHARS = 64
+
+def _script_language(text: str) -> Optional[str]:
+    """Classify by Unicode script; None for Latin-only or script-less text."""
+    counts = {}
+    for char in text[:_SCAN_CHARS]:
+        code = ord(char)
+        if code < 0x0900:
+            continue
+        index = bisect_right(_RANGE_STARTS, code) - 1
+        if index >= 0 and code <= _SCRIPT_RANGES[index][1]:
+            language = _SCRIPT_RANGES[index][2]
+            counts[language] = counts.get(language, 0) + 1
+    if not counts:
+        return None
+    # Japanese mixes kanji with kana; any kana means Japanese
+    if "ja" in counts:
+        return "ja"
+    return max(counts, key=counts.get)
+
+def _statistical_language(text: str) -> Optional[str]:
+    """Seeded langdetect, so the same text always gets the same answer."""
+    from langdetect import DetectorFactory, detect
+    from langdetect.lang_detect_exception import LangDetectException
+
+    DetectorFactory.seed = 0
+    try:
+        return detect(text)
+    except LangDetectException:
+        return None
+
+@lru_cache(maxsize=10000)
+def _detect(text: str) -> Optional[str]:
+    language = _script_language(text)
+    if language is not None:
+        return language
+    for char in text:
+        if char in _LATIN_HINTS:
+            return _LATIN_HINTS[char]
+    if not any(char.isalpha() for char in text):
+        return None
+    return _statistical_language(text)
+
+def detect_language(
+    text: str,
+    supported: Optional[Iterable[str]] = None,
+    default: Optional[str] = "en"
+) -> Optional[str]:
+    """Identify the language of a message.
+
+    Non-Latin scripts are classified from Unicode ranges; only Latin text
+    falls back to a seeded statistical detector. Results are memoized.
+    Returns ``default`` when the language is unknown or not in ``supported``.
+    Text is NFC-composed first, so decomposed accents still match the hints.
+    """
+    language = _detect(unicodedata.normalize("NFC", text.strip()).lower())
+    if language is None or (supported is not None and language not in supported):
+        return default
+    return language
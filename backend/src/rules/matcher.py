@@ -0,0 +1,172 @@
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+def normalize(text: str) -> str:
+    """Lowercase, NFC-compose and collapse whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+def _is_latin(ch: str) -> bool:
+    code = ord(ch)
+    return code < 0x250 or 0x1E00 <= code <= 0x1EFF
+
+def fold_accents(text: str) -> str:
+    """Drop accents and tone marks from Latin letters in a normalized text.
+
+    Only marks on Latin letters are removed: in Indic and other scripts
+    combining marks are vowel signs or viramas that change the word.
+    """
+    if text.isascii():
+        return text
+    folded = []
+    base_is_latin = False
+    for ch in unicodedata.normalize("NFD", text):
+        if unicodedata.combining(ch):
+            if base_is_latin:
+                continue
+        else:
+            base_is_latin = _is_latin(ch)
+        folded.append(ch)
+    return unicodedata.normalize("NFC", "".join(folded))
+
+class AhoCorasick:
+    """Aho-Corasick automaton reporting which patterns occur in a text.
+
+    All patterns are found in a single left-to-right pass over the text,
+    independently of how many patterns were compiled.
+    """
+
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for index, pattern in enumerate(self.patterns):
+            self._insert(pattern, index)
+        self._build_failure_links()
+
+        # Transitions with failure links resolved, filled in lazily. Only
+        # characters that occur in some pattern are cached; any other
+        # character sends the automaton back to the root.
+        self._alphabet = frozenset(ch for pattern in self.patterns for ch in pattern)
+        self._delta: List[Dict[str, int]] = [dict(edges) for edges in self._goto]
+
+    def _insert(self, pattern: str, index: int):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] += (index,)
+
+    def _build_failure_links(self):
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                # Merge outputs so each state reports every pattern ending there
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+    def _transition(self, state: int, ch: str) -> int:
+        """Resolve and memoize the transition from ``state`` on ``ch``."""
+        target = state
+        while target and ch not in self._goto[target]:
+            target = self._fail[target]
+        next_state = self._goto[target].get(ch, 0)
+        self._delta[state][ch] = next_state
+        return next_state
+
+    def find(self, text: str) -> Set[int]:
+        """Return the indices of all patterns occurring in ``text``."""
+        delta, out, alphabet = self._delta, self._out, self._alphabet
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            if ch not in alphabet:
+                state = 0
+                continue
+            next_state = delta[state].get(ch)
+            if next_state is None:
+                next_state = self._transition(state, ch)
+            state = next_state
+            if out[state]:
+                found.update(out[state])
+        return found
+
+class RuleMatcher:
+    """Compiled, priority-ordered response rules for a single language.
+
+    A rule fires when all of its patterns occur in the message; when several
+    rules fire, the one declared first wins. Rules are declared in the same
+    order ``get_response`` used to scan them: the language's ``responses``
+    (with nested rules requiring both the outer and inner key), then the
+    greeting, how-are-you and goodbye phrase lists. Patterns and messages
+    are compared in normalized, accent-folded form, so "Ça va" matches
+    "ca va".
+    """
+
+    def __init__(
+        self,
+        responses: Dict,
+        greetings: Iterable[str],
+        how_are_you_phrases: Iterable[str],
+        goodbyes: Iterable[str]
+    ):
+        self.default = responses["default"]
+        self._rules: List[Tuple[str, Tuple[int, ...], str]] = []
+        pattern_ids: Dict[str, int] = {}
+
+        def pattern_id(pattern: str) -> int:
+            return pattern_ids.setdefault(fold_accents(normalize(pattern)), len(pattern_ids))
+
+        for key, value in responses.get("responses", {}).items():
+            if isinstance(value, dict):
+                for sub_key, response in value.items():
+                    self._rules.append(
+                        ("responses", (pattern_id(key), pattern_id(sub_key)), response)
+                    )
+            else:
+                self._rules.append(("responses", (pattern_id(key),), value))
+
+        for category, phrases in (
+            ("greetings", greetings),
+            ("how_are_you", how_are_you_phrases),
+            ("goodbye", goodbyes),
+        ):
+            for phrase in phrases:
+                self._rules.append((category, (pattern_id(phrase),), responses[category][0]))
+
+        self._automaton = AhoCorasick(sorted(pattern_ids, key=pattern_ids.get))
+        # Map each pattern to the rules it takes part in, in priority order
+        self._rules_by_pattern: List[List[int]] = [[] for _ in pattern_ids]
+        for rule_index, (_, required, _) in enumerate(self._rules):
+            for pattern in set(required):
+                self._rules_by_pattern[pattern].append(rule_index)
+
+    def match(self, message: str) -> Tuple[str, str]:
+        """Return ``(category, response)`` for a raw message.
+
+        ``category`` is ``"default"`` when no rule fired.
+        """
+        found = self._automaton.find(fold_accents(normalize(message)))
+        best: Optional[int] = None
+        for pattern in found:
+            for rule_index in self._rules_by_pattern[pattern]:
+                if best is not None and rule_index >= best:
+                    break
+                if all(required in found for required in self._rules[rule_index][1]):
+                    best = rule_index
+                    break
+        if best is None:
+            return "default", self.default
+        category, _, response = self._rules[best]
+        return category, response
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .matcher import RuleMatcher
+
+# One <language>.json per language; files starting with "_" are not languages
+PACKS_DIR = os.path.join(os.path.dirname(__file__), "packs")
+# Greeting, how-are-you and goodbye phrases recognized in every language
+TRIGGERS_FILE = "_triggers.json"
+TRIGGER_CATEGORIES = ("greetings", "how_are_you", "goodbye")
+DEFAULT_LANGUAGE = "en"
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Return a file's (mtime, size), or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _read_json(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must contain a JSON object")
+    return data
+
+class ResponsePack(NamedTuple):
+    """One language's replies and the rules compiled from them."""
+
+    language: str
+    data: Dict
+    triggers: Dict[str, Tuple[str, ...]]
+    matcher: RuleMatcher
+    stamp: Tuple[int, int]
+
+class _Index(NamedTuple):
+    """An immutable snapshot of the available and compiled packs."""
+
+    files: Dict[str, Tuple[int, int]]
+    triggers: Dict[str, Tuple[str, ...]]
+    triggers_stamp: Optional[Tuple[int, int]]
+    packs: Dict[str, ResponsePack]
+
+class ResponsePacks(Mapping):
+    """Rule-engine response packs loaded from per-language JSON files.
+
+    Each ``<language>.json`` holds ``greetings``, ``how_are_you``,
+    ``goodbye``, ``default`` and optional ``responses`` (and optional
+    ``triggers`` extending the shared phrases in ``_triggers.json``). A
+    language is read and compiled into a RuleMatcher on first use. Lookups
+    read an immutable index without locking. With ``reload_seconds`` a
+    background thread polls the files and publishes a new index when one
+    changes, so in-flight requests finish on the index they started with.
+    A file that fails to load is logged and its previous version kept.
+
+    Maps language codes to compiled RuleMatchers, so it can stand in for a
+    ``{language: matcher}`` table; ``pack`` returns a language's full pack.
+    """
+
+    def __init__(
+        self,
+        directory: str = PACKS_DIR,
+        reload_seconds: Optional[float] = None,
+        default_language: str = DEFAULT_LANGUAGE
+    ):
+        self.directory = directory
+        self.default_language = default_language
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "reloads": 0, "errors": 0}
+        # Stamps of pack files that failed to load, so they are not retried per request
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        self._index = _Index({}, {category: () for category in TRIGGER_CATEGORIES}, None, {})
+        self.reload()
+
+        self._stop = threading.Event()
+        self._watcher = None
+        if reload_seconds:
+            self._watcher = threading.Thread(
+                target=self._watch, args=(reload_seconds,), daemon=True
+            )
+            self._watcher.start()
+
+    def __getitem__(self, language: str) -> RuleMatcher:
+        return self.pack(language).matcher
+
+    def pack(self, language: str) -> ResponsePack:
+        """Return a language's pack, loading it on first use."""
+        index = self._index
+        pack = index.packs.get(language)
+        if pack is not None:
+            return pack
+        if language not in index.files:
+            raise KeyError(language)
+        pack = self._load(language)
+        if pack is None:
+            raise KeyError(language)
+        return pack
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index.files)
+
+    def __len__(self) -> int:
+        return len(self._index.files)
+
+    def __contains__(self, language) -> bool:
+        # Answered from the file listing, without loading the pack
+        return language in self._index.files
+
+    def languages(self) -> List[str]:
+        """Return the languages with a pack, loaded or not."""
+        return list(self._index.files)
+
+    def resolve(self, language: str) -> str:
+        """Return the language whose pack answers ``language``."""
+        return language if language in self else self.default_language
+
+    def match(self, message: str, language: str) -> Tuple[str, str]:
+        """Match a raw message against a language's rules.
+
+        Returns ``(category, response)``; unknown languages use the default
+        language's rules.
+        """
+        matcher = self.get(language) or self[self.default_language]
+        return matcher.match(message)
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        files = {}
+        for name in sorted(os.listdir(self.directory)):
+            language, extension = os.path.splitext(name)
+            if extension == ".json" and not name.startswith("_"):
+                stamp = _stamp(os.path.join(self.directory, name))
+                if stamp is not None:
+                    files[language] = stamp
+        return files
+
+    def _read_triggers(self) -> Dict[str, Tuple[str, ...]]:
+        path = os.path.join(self.directory, TRIGGERS_FILE)
+        data = _read_json(path) if os.path.exists(path) else {}
+        return {category: tuple(data.get(category, ())) for category in TRIGGER_CATEGORIES}
+
+    def _compile(
+        self,
+        language: str,
+        stamp: Tuple[int, int],
+        shared: Dict[str, Tuple[str, ...]]
+    ) -> ResponsePack:
+        data = _read_json(os.path.join(self.directory, f"{language}.json"))
+        for key in ("default", *TRIGGER_CATEGORIES):
+            if key not in data:
+                raise ValueError(f"Response pack {language} has no {key!r}")
+        extra = data.get("triggers", {})
+        triggers = {
+            category: shared[category] + tuple(extra.get(category, ()))
+            for category in TRIGGER_CATEGORIES
+        }
+        matcher = RuleMatcher(
+            data, triggers["greetings"], triggers["how_are_you"], triggers["goodbye"]
+        )
+        return ResponsePack(language, data, triggers, matcher, stamp)
+
+    def _load(self, language: str) -> Optional[ResponsePack]:
+        """Compile a language on first use and publish it in a new index."""
+        with self._lock:
+            index = self._index
+            if language in index.packs:
+                return index.packs[language]
+            stamp = index.files.get(language)
+            if stamp is None or self._failed.get(language) == stamp:
+                return None
+            try:
+                pack = self._compile(language, stamp, index.triggers)
+            except (OSError, ValueError) as e:
+                self._failed[language] = stamp
+                self._counters["errors"] += 1
+                self.logger.error(f"Error loading response pack {language}: {str(e)}")
+                return None
+            self._index = index._replace(packs={**index.packs, language: pack})
+            self._counters["loads"] += 1
+            return pack
+
+    def reload(self) -> bool:
+        """Recompile changed packs and publish a new index; return whether anything changed.
+
+        Packs that were never used stay unloaded; removed files drop their
+        language.
+        """
+        try:
+            files = self._scan()
+        except OSError as e:
+            self._counters["errors"] += 1
+            self.logger.error(f"Error scanning response packs: {str(e)}")
+            return False
+        triggers_stamp = _stamp(os.path.join(self.directory, TRIGGERS_FILE))
+
+        with self._lock:
+            index = self._index
+            if files == index.files and triggers_stamp == index.triggers_stamp:
+                return False
+
+            triggers = index.triggers
+            if triggers_stamp != index.triggers_stamp:
+                try:
+                    triggers = self._read_triggers()
+                except (OSError, ValueError) as e:
+                    self._counters["errors"] += 1
+                    self.logger.error(f"Error loading {TRIGGERS_FILE}: {str(e)}")
+
+            packs = {}
+            for language, pack in index.packs.items():
+                stamp = files.get(language)
+                if stamp is None:
+                    continue
+                if stamp == pack.stamp and triggers is index.triggers:
+                    packs[language] = pack
+                    continue
+                try:
+                    packs[language] = self._compile(language, stamp, triggers)
+                except (OSError, ValueError) as e:
+                    self._counters["errors"] += 1
+                    self.logger.error(f"Error reloading response pack {language}: {str(e)}")
+                    # Keep serving the previous version until the file is fixed
+                    packs[language] = pack._replace(stamp=stamp)
+
+            self._index = _Index(files, triggers, triggers_stamp, packs)
+            if index.files:
+                self._counters["reloads"] += 1
+                self.logger.info(f"Reloaded response packs: {len(files)} languages, {len(packs)} loaded")
+            return True
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            self.reload()
+
+    def close(self):
+        """Stop watching the pack files."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def stats(self) -> Dict:
+        index = self._index
+        return {
+            **self._counters,
+            "languages": len(index.files),
+            "loaded": sorted(index.packs),
+        }
+
+def packs_from_env() -> ResponsePacks:
+    """Build the response packs from RESPONSE_PACKS_DIR / RESPONSE_PACKS_RELOAD_SECONDS."""
+    return ResponsePacks(
+        os.getenv("RESPONSE_PACKS_DIR", PACKS_DIR),
+        reload_seconds=float(os.getenv("RESPONSE_PACKS_RELOAD_SECONDS", "2")) or None
+    )
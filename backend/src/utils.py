@@ -1,24 +1,166 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
-from datetime import datetime
-
-def setup_logging(log_dir: str = "logs"):
-    """Setup logging configuration."""
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-        
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_file = os.path.join(log_dir, f"chatbot_{timestamp}.log")
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# ID of the request being handled, added to every log record
+REQUEST_ID = contextvars.ContextVar("request_id", default="-")
+
+_lock = threading.Lock()
+_listeners: List[QueueListener] = []
+_configured = False
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class RequestIdFilter(logging.Filter):
+    """Tag records with the current request ID."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = REQUEST_ID.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including ``extra`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _start_listener(handlers, queue_size: int) -> QueueHandler:
+    """Start a background writer for ``handlers`` and return the handler feeding it."""
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    handler = _NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    return handler
+
+def setup_logging(
+    log_dir: str = "logs",
+    level="INFO",
+    file_name: str = "chatbot.log",
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    queue_size: int = 10000
+):
+    """Setup logging configuration.
+
+    Log calls only put the record on a bounded queue; a background thread
+    writes it to the console and to a size-rotated file. When the queue is
+    full (e.g. the disk stalls) records are dropped rather than blocking the
+    caller. Only the first call configures logging; later calls are no-ops.
+    """
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        file_handler = RotatingFileHandler(
+            os.path.join(log_dir, file_name),
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8"
+        )
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(_start_listener([file_handler, stream_handler], queue_size))
+        _configured = True
+
+def setup_logging_from_env(file_name: str = "chatbot.log"):
+    """Setup logging from LOG_DIR, LOG_LEVEL, LOG_MAX_BYTES and LOG_BACKUP_COUNT."""
+    setup_logging(
+        log_dir=os.getenv("LOG_DIR", "logs"),
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        file_name=file_name,
+        max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
     )
 
+def stop_logging():
+    """Flush queued records and stop the background writers."""
+    with _lock:
+        while _listeners:
+            _listeners.pop().stop()
+
+atexit.register(stop_logging)
+
+class RequestLog:
+    """Structured JSON request log with per-request IDs and sampling.
+
+    One line per request is written to its own size-rotated file by a
+    background thread. ``sample_rate`` is the fraction of requests logged;
+    server errors are always logged.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        queue_size: int = 10000
+    ):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.sample_rate = sample_rate
+
+        file_handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        self.logger = logging.getLogger("chatbot.requests")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.handlers = [_start_listener([file_handler], queue_size)]
+
+    def log(self, status: int, **fields):
+        """Log a finished request, subject to sampling."""
+        if status < 500 and random.random() >= self.sample_rate:
+            return
+        self.logger.info("request", extra={"fields": {"status": status, **fields}})
+
+def request_log_from_env() -> Optional[RequestLog]:
+    """Build the request log from REQUEST_LOG_PATH / REQUEST_LOG_SAMPLE_RATE, if set."""
+    path = os.getenv("REQUEST_LOG_PATH")
+    if not path:
+        return None
+    return RequestLog(path, sample_rate=float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1.0")))
+
 def get_project_root():
     """Get the absolute path to the project root directory."""
-    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..")) 
\ No newline at end of file
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the server modules the way backend/src/main.py does (ml.x, rules.x)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
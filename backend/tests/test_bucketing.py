@@ -0,0 +1,64 @@
+import random
+from collections import Counter
+
+import pytest
+
+# The sampler is pure Python, but its module also holds the torch Trainer subclass
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from ml.bucketing import TokenBudgetBatchSampler
+
+def make_dataset(size=500, seed=0):
+    rng = random.Random(seed)
+    sources = [rng.randint(1, 120) for _ in range(size)]
+    targets = [rng.randint(1, 60) for _ in range(size)]
+    languages = [rng.choice(["hi", "te", "en"]) for _ in range(size)]
+    return sources, targets, languages
+
+def padded_tokens(sampler, batch):
+    return len(batch) * (
+        max(sampler.source_lengths[i] for i in batch)
+        + max(sampler.target_lengths[i] for i in batch)
+    )
+
+@pytest.mark.parametrize("max_tokens, max_batch_size", [(512, None), (2048, 16), (256, 4)])
+def test_batches_stay_within_budget(max_tokens, max_batch_size):
+    sources, targets, languages = make_dataset()
+    sampler = TokenBudgetBatchSampler(
+        sources, languages, target_lengths=targets,
+        max_tokens=max_tokens, max_batch_size=max_batch_size
+    )
+    for batch in sampler:
+        # A single example over the budget still gets a batch of its own
+        assert len(batch) == 1 or padded_tokens(sampler, batch) <= max_tokens
+        if max_batch_size:
+            assert len(batch) <= max_batch_size
+        assert len({languages[i] for i in batch}) == 1
+
+@pytest.mark.parametrize("shuffle", [True, False])
+def test_every_example_appears_exactly_once(shuffle):
+    sources, targets, languages = make_dataset()
+    sampler = TokenBudgetBatchSampler(
+        sources, languages, target_lengths=targets, max_tokens=1024, shuffle=shuffle
+    )
+    for epoch in range(3):
+        sampler.set_epoch(epoch)
+        batches = list(sampler)
+        assert len(batches) == len(sampler)
+        counts = Counter(index for batch in batches for index in batch)
+        assert sorted(counts) == list(range(len(sources)))
+        assert set(counts.values()) == {1}
+
+def test_oversized_example_is_kept():
+    sampler = TokenBudgetBatchSampler([10, 5000, 20], max_tokens=100)
+    assert sorted(i for batch in sampler for i in batch) == [0, 1, 2]
+
+def test_set_epoch_reshuffles_deterministically():
+    sources, targets, languages = make_dataset()
+    sampler = TokenBudgetBatchSampler(sources, languages, target_lengths=targets, max_tokens=1024)
+    sampler.set_epoch(1)
+    first = list(sampler)
+    assert list(sampler) == first
+    sampler.set_epoch(2)
+    assert list(sampler) != first
@@ -0,0 +1,100 @@
+import asyncio
+
+from ml.cache import ResponseCache
+
+class CountingEngine:
+    """Engine stub that counts generations and can be held mid-generation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def submit(self, input_text, language, **kwargs):
+        self.calls += 1
+        await self.release.wait()
+        return f"{language}:{input_text.upper()}"
+
+def test_hits_after_first_generation():
+    async def run():
+        engine = CountingEngine()
+        cache = ResponseCache(engine)
+        assert await cache.submit("hello", "en") == "en:HELLO"
+        # Whitespace and Unicode composition do not change the key
+        assert await cache.submit("  hello ", "en") == "en:HELLO"
+        assert engine.calls == 1
+        assert cache.stats()["hits"] == 1
+        await cache.submit("hello", "en", num_beams=1)
+        assert engine.calls == 2
+    asyncio.run(run())
+
+def test_ttl_expires_entries(monkeypatch):
+    now = {"value": 1000.0}
+    monkeypatch.setattr("ml.cache.time.time", lambda: now["value"])
+
+    async def run():
+        engine = CountingEngine()
+        cache = ResponseCache(engine, ttl_seconds=10)
+        await cache.submit("hello", "en")
+        now["value"] += 10
+        await cache.submit("hello", "en")
+        assert engine.calls == 1
+        now["value"] += 0.5
+        await cache.submit("hello", "en")
+        assert engine.calls == 2
+        assert cache.stats()["expirations"] == 1
+    asyncio.run(run())
+
+def test_lru_eviction():
+    async def run():
+        engine = CountingEngine()
+        cache = ResponseCache(engine, max_entries=2)
+        await cache.submit("a", "en")
+        await cache.submit("b", "en")
+        await cache.submit("a", "en")  # a is now most recently used
+        await cache.submit("c", "en")  # evicts b
+        assert engine.calls == 3
+        await cache.submit("a", "en")
+        assert engine.calls == 3
+        await cache.submit("b", "en")
+        assert engine.calls == 4
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 2
+    asyncio.run(run())
+
+def test_concurrent_misses_share_one_generation():
+    async def run():
+        engine = CountingEngine()
+        engine.release.clear()
+        cache = ResponseCache(engine)
+        tasks = [asyncio.ensure_future(cache.submit("hello", "en")) for _ in range(5)]
+        await asyncio.sleep(0)
+        # One caller going away does not cancel the shared generation
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        engine.release.set()
+        results = await asyncio.gather(*tasks[1:])
+        assert results == ["en:HELLO"] * 4
+        assert engine.calls == 1
+        stats = cache.stats()
+        assert stats["deduplicated"] == 4
+        assert stats["inflight"] == 0
+        assert await cache.submit("hello", "en") == "en:HELLO"
+        assert engine.calls == 1
+    asyncio.run(run())
+
+def test_token_id_inputs_bypass_the_cache():
+    class IdsEngine(CountingEngine):
+        async def submit(self, input_text, language, **kwargs):
+            self.calls += 1
+            return str(input_text)
+
+    async def run():
+        engine = IdsEngine()
+        cache = ResponseCache(engine)
+        await cache.submit([1, 2, 3], "en")
+        await cache.submit([1, 2, 3], "en")
+        assert engine.calls == 2
+        assert cache.stats()["entries"] == 0
+    asyncio.run(run())
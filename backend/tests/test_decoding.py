@@ -0,0 +1,59 @@
+import pytest
+
+from ml.decoding import MIN_STEP_MS, DecodingPolicy
+
+def test_rejects_non_positive_soft_limit():
+    with pytest.raises(ValueError):
+        DecodingPolicy(queue_soft_limit=0)
+
+def test_unknown_quality_tier():
+    with pytest.raises(ValueError):
+        DecodingPolicy().choose(quality="turbo")
+
+def test_defaults_without_budget_or_load():
+    policy = DecodingPolicy()
+    assert policy.choose() == {"num_beams": 5, "max_length": 100, "strategy": "full_beam"}
+    assert policy.choose(quality="fast")["num_beams"] == 1
+
+@pytest.mark.parametrize("depth, strategy, max_length", [
+    (15, "full_beam", 100),   # just under the soft limit
+    (16, "small_beam", 100),  # at the limit: one strategy down
+    (32, "greedy", 50),       # two limits: two strategies down, half the length
+    (1000, "greedy", 16),     # never below min_max_length
+])
+def test_queue_depth_boundaries(depth, strategy, max_length):
+    policy = DecodingPolicy(queue_depth=lambda: depth, queue_soft_limit=16)
+    choice = policy.choose()
+    assert choice["strategy"] == strategy
+    assert choice["max_length"] == max_length
+
+def test_budget_boundaries():
+    # No observations: a step costs initial_step_ms scaled by the beam cost (full beam = 2x)
+    policy = DecodingPolicy(initial_step_ms=10.0)
+    # Exactly enough for 100 full-beam steps
+    assert policy.choose(latency_budget_ms=2000)["strategy"] == "full_beam"
+    # Just short: small beam (1.25x) fits 100 steps
+    choice = policy.choose(latency_budget_ms=1999)
+    assert choice == {"num_beams": 2, "max_length": 100, "strategy": "small_beam"}
+    # Greedy cannot fit 100 steps, so the length is cut to what fits
+    choice = policy.choose(latency_budget_ms=500)
+    assert choice == {"num_beams": 1, "max_length": 50, "strategy": "greedy"}
+    # Never below min_max_length, even when the budget cannot cover it
+    assert policy.choose(latency_budget_ms=1)["max_length"] == 16
+
+def test_budget_uses_observed_cost_at_likely_batch_size():
+    depth = {"value": 0}
+    policy = DecodingPolicy(queue_depth=lambda: depth["value"], initial_step_ms=1000.0, max_batch_size=4)
+    policy.observe(5, steps=100, seconds=1.0, batch_size=1)    # 10 ms per step alone
+    policy.observe(5, steps=100, seconds=3.0, batch_size=4)    # 30 ms per step in a full batch
+    assert policy.choose(latency_budget_ms=1000)["strategy"] == "full_beam"
+    depth["value"] = 10  # batch size capped at max_batch_size
+    assert policy.step_ms(5, 4) == pytest.approx(30.0)
+    assert policy.choose(latency_budget_ms=1000)["strategy"] != "full_beam"
+
+def test_step_cost_floor():
+    policy = DecodingPolicy()
+    policy.observe(1, steps=10, seconds=0.0)
+    assert policy.step_ms(1) == MIN_STEP_MS
+    policy.observe(1, steps=0, seconds=1.0)  # ignored
+    assert policy.stats()["step_ms"] == {1: {1: 0.0}}
@@ -0,0 +1,95 @@
+import itertools
+import random
+import unicodedata
+
+import pytest
+
+from rules.language_detection import detect_language
+from rules.matcher import fold_accents
+from rules.responses import ResponsePacks
+
+PACKS = ResponsePacks()
+
+# The phrase lists get_response scanned before the rules were compiled
+GREETINGS = ["hi", "hello", "hey", "bonjour", "hola", "你好", "こんにちは",
+             "नमस्ते", "ẹ nlẹ́", "salut", "buenos dias"]
+HOW_ARE_YOU_PHRASES = ["how are you", "comment ca va", "que tal", "お元気ですか",
+                       "कैसे हो", "báwo ni", "como estas"]
+GOODBYES = ["bye", "goodbye", "au revoir", "adios", "さようなら", "अलविदा",
+            "ó dàbọ̀", "hasta luego"]
+
+def legacy_get_response(message: str, responses: dict) -> str:
+    """get_response as it scanned the rules before RuleMatcher."""
+    message = message.lower().strip()
+    for key, nested_responses in responses.get("responses", {}).items():
+        if isinstance(nested_responses, dict):
+            if key in message:
+                for sub_key, response in nested_responses.items():
+                    if sub_key in message:
+                        return response
+        elif key in message:
+            return nested_responses
+
+    if any(greeting in message for greeting in GREETINGS):
+        return responses["greetings"][0]
+    elif any(phrase in message for phrase in HOW_ARE_YOU_PHRASES):
+        return responses["how_are_you"][0]
+    elif any(bye in message for bye in GOODBYES):
+        return responses["goodbye"][0]
+    return responses["default"]
+
+def unaccented_messages(data: dict):
+    """Rule hits, misses and combinations without Latin accents."""
+    triggers = []
+    for key, value in data.get("responses", {}).items():
+        triggers.append(key)
+        if isinstance(value, dict):
+            triggers.extend(f"{key} {sub_key}" for sub_key in value)
+    triggers += GREETINGS + HOW_ARE_YOU_PHRASES + GOODBYES
+    triggers = [trigger for trigger in triggers if fold_accents(trigger) == trigger]
+
+    rng = random.Random(0)
+    pairs = [" ".join(rng.sample(triggers, 2)) for _ in range(200)]
+    filler = "please tell me something about the weather today"
+    return (
+        triggers
+        + [trigger.upper() for trigger in triggers]
+        + [f"{filler} {trigger}" for trigger in triggers]
+        + pairs
+        + [filler, "", "xyz"]
+    )
+
+@pytest.mark.parametrize("language", PACKS.languages())
+def test_matcher_agrees_with_legacy_get_response(language):
+    data = PACKS.pack(language).data
+    # Accented rule keys are where the matcher deliberately differs (it folds accents)
+    if any(fold_accents(key) != key for key in data.get("responses", {})):
+        pytest.skip(f"{language} has accented rule keys")
+    for message in unaccented_messages(data):
+        _, response = PACKS.match(message, language)
+        assert response == legacy_get_response(message, data), message
+
+def test_matcher_folds_accents():
+    data = PACKS.pack("fr").data
+    _, response = PACKS.match("Comment ça va?", "fr")
+    assert response == data["responses"]["comment ca va"]
+
+def test_unknown_language_uses_default_pack():
+    assert PACKS.match("hello", "xx") == PACKS.match("hello", PACKS.default_language)
+
+@pytest.mark.parametrize("text, language", [
+    ("ẹ kú àárọ̀", "yo"),
+    ("ṣé dáadáa ni", "yo"),
+    ("ị bịa", "ig"),
+    ("ina ƙaunar ki", "ha"),
+    ("नमस्ते", "hi"),
+    ("నమస్కారం", "te"),
+])
+def test_detect_language_on_decomposed_text(text, language):
+    assert detect_language(text) == language
+    assert detect_language(unicodedata.normalize("NFD", text)) == language
+
+def test_detect_language_defaults():
+    assert detect_language("12345") == "en"
+    assert detect_language("12345", default=None) is None
+    assert detect_language("नमस्ते", supported=["en", "te"]) == "en"
@@ -47,6 +47,48 @@ const LANGUAGE_NAMES = {
   'ko': 'Korean'
 };
 
+// Read a reply from /chat/stream (Server-Sent Events), reporting the
+// partial text after every chunk
+const streamReply = async (message, language, onText) => {
+  const response = await fetch(`${API_URL}/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ message, language }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const rawEvent of events) {
+      let eventName = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) eventName = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (eventName === 'error') throw new Error(payload.detail);
+      text = eventName === 'done' ? payload.response : text + payload.token;
+      onText(text);
+    }
+  }
+  return text;
+};
+
 function App() {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
@@ -73,21 +115,34 @@ function App() {
     setMessages(prev => [...prev, newMessage]);
     setInputMessage('');
 
+    // Add an empty bot message and fill it in as the reply streams in
+    const botMessage = {
+      id: `bot-${Date.now()}`,
+      text: '',
+      sender: 'bot',
+      timestamp: new Date().toISOString(),
+    };
+    setMessages(prev => [...prev, botMessage]);
+
+    const updateBotMessage = (text) => {
+      setMessages(prev => prev.map(message => (
+        message.id === botMessage.id ? { ...message, text } : message
+      )));
+    };
+
     try {
-      const response = await axios.post(`${API_URL}/chat`, {
-        message: inputMessage,
-        language: selectedLanguage,
-      });
-
-      const botMessage = {
-        text: response.data.response,
-        sender: 'bot',
-        timestamp: new Date().toISOString(),
-      };
-
-      setMessages(prev => [...prev, botMessage]);
+      await streamReply(inputMessage, selectedLanguage, updateBotMessage);
     } catch (error) {
-      console.error('Error sending message:', error);
+      console.error('Error streaming message, falling back to /chat:', error);
+      try {
+        const response = await axios.post(`${API_URL}/chat`, {
+          message: inputMessage,
+          language: selectedLanguage,
+        });
+        updateBotMessage(response.data.response);
+      } catch (fallbackError) {
+        console.error('Error sending message:', fallbackError);
+      }
     }
   };
 